@@ -1,9 +1,59 @@
-from .const import DOMAIN
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from . import websocket
+from .client import VwIdClientPool
+from .coordinator import VwIdFleet
+from .const import (
+    CONF_VIN,
+    DATA_CLIENTS,
+    DOMAIN,
+    STORAGE_KEY_METERS,
+    STORAGE_KEY_STATUS,
+    STORAGE_KEY_TOKENS,
+    STORAGE_VERSION,
+)
+from .profiler import ATTR_TOP, DEFAULT_TOP, SERVICE_PROFILE_REFRESH, async_profile_refresh
 from homeassistant.helpers.discovery import async_load_platform
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.storage import Store
 from homeassistant import config_entries, core
 
+_LOGGER = logging.getLogger(__name__)
+
+PLATFORMS = ["sensor", "number", "select", "switch"]
+
+PROFILE_REFRESH_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_VIN): cv.string,
+        vol.Optional(ATTR_TOP, default=DEFAULT_TOP): cv.positive_int,
+    }
+)
+
 async def async_setup(hass, config):
 # 	hass.async_add_job(async_load_platform(hass, 'sensor', DOMAIN, {}, config))
+
+	async def async_handle_profile_refresh(call):
+		"""Profile a refresh of the vehicles of all entries."""
+		fleets = [
+			fleet
+			for fleet in hass.data.get(DOMAIN, {}).values()
+			if isinstance(fleet, VwIdFleet)
+		]
+		await async_profile_refresh(
+			hass, fleets, call.data.get(CONF_VIN), call.data[ATTR_TOP]
+		)
+
+	hass.services.async_register(
+		DOMAIN,
+		SERVICE_PROFILE_REFRESH,
+		async_handle_profile_refresh,
+		schema=PROFILE_REFRESH_SCHEMA,
+	)
+	websocket.async_setup(hass)
 	return True
 	
 	
@@ -11,12 +61,69 @@ async def async_setup_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ) -> bool:
     """Set up platform from a ConfigEntry."""
+    started = time.monotonic()
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = entry.data
+    if DATA_CLIENTS not in hass.data[DOMAIN]:
+        hass.data[DOMAIN][DATA_CLIENTS] = VwIdClientPool(hass)
+    clients = hass.data[DOMAIN][DATA_CLIENTS]
+    fleet = VwIdFleet(hass, entry, await clients.async_acquire(entry))
+    try:
+        await fleet.async_setup()
+    except Exception:
+        # Polling may have started before a push transport failed to start
+        fleet.async_shutdown()
+        await clients.async_release(entry)
+        raise
+    hass.data[DOMAIN][entry.entry_id] = fleet
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
 
-    # Forward the setup to the sensor platform.
-    hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, "sensor")
-    )
+    async def async_forward_setup():
+        """Forward the setup to the platforms and time the startup."""
+        await asyncio.gather(
+            *(
+                hass.config_entries.async_forward_entry_setup(entry, platform)
+                for platform in PLATFORMS
+            )
+        )
+        fleet.startup_duration = time.monotonic() - started
+        _LOGGER.debug(
+            "%s set up with all entities in %.3f s",
+            entry.title,
+            fleet.startup_duration,
+        )
+
+    hass.async_create_task(async_forward_setup())
     return True
 
+
+async def async_update_options(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> None:
+    """Reload a ConfigEntry, so the fleet is set up with the new options."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_unload_entry(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> bool:
+    """Unload a ConfigEntry and release its shared API client."""
+    unload_ok = all(
+        await asyncio.gather(
+            *(
+                hass.config_entries.async_forward_entry_unload(entry, platform)
+                for platform in PLATFORMS
+            )
+        )
+    )
+    if unload_ok:
+        hass.data[DOMAIN].pop(entry.entry_id).async_shutdown()
+        await hass.data[DOMAIN][DATA_CLIENTS].async_release(entry)
+    return unload_ok
+
+
+async def async_remove_entry(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> None:
+    """Remove the stored tokens, meters and statuses of a deleted ConfigEntry."""
+    for key in (STORAGE_KEY_TOKENS, STORAGE_KEY_METERS, STORAGE_KEY_STATUS):
+        await Store(hass, STORAGE_VERSION, key.format(entry.entry_id)).async_remove()
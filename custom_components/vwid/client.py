@@ -0,0 +1,89 @@
+"""Shared We Connect ID clients, one per account."""
+import asyncio
+import logging
+
+from homeassistant import config_entries, core
+from homeassistant.const import CONF_NAME, CONF_PASSWORD, EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.helpers.storage import Store
+
+from .const import STORAGE_KEY_TOKENS, STORAGE_VERSION
+from .libvwid import vwid
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class VwIdClientPool:
+    """Reference counted registry of API clients keyed by account.
+
+    All config entries of the same account share one authenticated client,
+    so a login or token refresh is only done once for all of them. Every
+    client has its own HTTP session, keeping its connections alive between
+    polls and its login cookies out of Home Assistant's shared session.
+    """
+
+    def __init__(self, hass: core.HomeAssistant):
+        """Initialize the pool."""
+        self.hass = hass
+        self._clients = {}
+        self._users = {}
+        self._entries = {}
+        self._lock = asyncio.Lock()
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, self._async_close_all)
+
+    async def _async_close_all(self, _event) -> None:
+        """Close the sessions of all clients when Home Assistant stops."""
+        for api in self._clients.values():
+            api.close()
+            await api.close_session()
+
+    @staticmethod
+    def account_key(entry: config_entries.ConfigEntry) -> str:
+        """Return the key identifying the account of an entry."""
+        return entry.data[CONF_NAME].strip().lower()
+
+    async def async_acquire(self, entry: config_entries.ConfigEntry) -> vwid:
+        """Return the client of the entry's account, creating it if needed."""
+        account = self.account_key(entry)
+        async with self._lock:
+            api = self._clients.get(account)
+            if api is None:
+                api = vwid()
+                api.set_credentials(entry.data[CONF_NAME], entry.data[CONF_PASSWORD])
+                self._clients[account] = api
+                self._users[account] = set()
+                _LOGGER.debug("Created client for %s", account)
+
+            if api.tokens is None:
+                # Restore tokens from the last run, so a restart only costs a
+                # token refresh instead of the full login
+                stored = await Store(
+                    self.hass,
+                    STORAGE_VERSION,
+                    STORAGE_KEY_TOKENS.format(entry.entry_id),
+                ).async_load()
+                if stored:
+                    api.set_tokens(stored["tokens"])
+
+            self._users[account].add(entry.entry_id)
+            self._entries[entry.entry_id] = account
+            return api
+
+    def get(self, entry: config_entries.ConfigEntry) -> vwid:
+        """Return the client acquired for an entry."""
+        return self._clients[self._entries[entry.entry_id]]
+
+    async def async_release(self, entry: config_entries.ConfigEntry) -> None:
+        """Release the entry's client, closing it when no entry uses it."""
+        async with self._lock:
+            account = self._entries.pop(entry.entry_id, None)
+            if account is None:
+                return
+
+            users = self._users[account]
+            users.discard(entry.entry_id)
+            if not users:
+                api = self._clients.pop(account)
+                api.close()
+                await api.close_session()
+                del self._users[account]
+                _LOGGER.debug("Closed client for %s", account)
@@ -0,0 +1,160 @@
+"""Commands and setting changes sent to a vehicle."""
+import logging
+from typing import Any, Dict, Tuple
+
+from homeassistant import core
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+
+from .libvwid import ApiError
+from .model import SECTION_NAMES, VehicleStatus, api_key
+
+_LOGGER = logging.getLogger(__name__)
+
+# Setting changes made within this many seconds of each other are sent as
+# one write per settings section
+WRITE_DELAY = 5
+
+# Seconds a written value is shown before the car must have confirmed it
+OPTIMISTIC_TIMEOUT = 120
+
+# API keys written for each settings section, with the current value of
+# those not changed. The temperatures in K and F follow the one in C.
+WRITABLE_SETTINGS = {
+    "charging_settings": (
+        "maxChargeCurrentAC",
+        "autoUnlockPlugWhenCharged",
+        "targetSOC_pct",
+    ),
+    "climatisation_settings": (
+        "targetTemperature_C",
+        "climatisationWithoutExternalPower",
+        "climatizationAtUnlock",
+        "windowHeatingEnabled",
+        "zoneFrontLeftEnabled",
+        "zoneFrontRightEnabled",
+    ),
+}
+
+# Settings sections by the URL path segment of their write request
+SETTINGS_DOMAINS = {
+    "charging_settings": "charging",
+    "climatisation_settings": "climatisation",
+}
+
+
+class VwIdCommander:
+    """Sends commands and setting changes of one vehicle.
+
+    Setting changes are collected for WRITE_DELAY seconds and then written
+    with one request per settings section. Entities show the value they
+    set (see optimistic()) until the car reports it, or OPTIMISTIC_TIMEOUT
+    passed, and one refresh right after the write confirms it.
+    """
+
+    def __init__(self, hass: core.HomeAssistant, fleet, vin: str):
+        """Initialize the commander."""
+        self.hass = hass
+        self.fleet = fleet
+        self.vin = vin
+        self.writes = 0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._optimistic: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._unsub_write = None
+
+    @property
+    def status(self) -> VehicleStatus:
+        """Return the last polled status."""
+        return self.fleet.coordinators[self.vin].data
+
+    def optimistic(self, section: str, field: str, polled: Any) -> Any:
+        """Return the value set for a field, or the polled one."""
+        value, expires = self._optimistic.get((section, field), (polled, 0))
+        if value == polled or self.hass.loop.time() >= expires:
+            self._optimistic.pop((section, field), None)
+            return polled
+        return value
+
+    @callback
+    def async_set_optimistic(self, section: str, field: str, value: Any) -> None:
+        """Show a value until the car confirms it."""
+        expires = self.hass.loop.time() + OPTIMISTIC_TIMEOUT
+        self._optimistic[(section, field)] = (value, expires)
+
+    @callback
+    def async_set(self, section: str, field: str, value: Any) -> None:
+        """Change a setting with the next write of its section."""
+        self.async_set_optimistic(section, field, value)
+        self._pending.setdefault(section, {})[api_key(section, field)] = value
+        if self._unsub_write:
+            self._unsub_write()
+        self._unsub_write = async_call_later(
+            self.hass, WRITE_DELAY, self._async_handle_write
+        )
+
+    @callback
+    def _async_handle_write(self, _now) -> None:
+        """Write the pending changes."""
+        self._unsub_write = None
+        self.hass.async_create_task(self.async_write())
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Drop the changes not written yet."""
+        if self._unsub_write:
+            self._unsub_write()
+            self._unsub_write = None
+        self._pending.clear()
+
+    async def async_write(self) -> None:
+        """Write the pending changes now, one request per section."""
+        if self._unsub_write:
+            self._unsub_write()
+            self._unsub_write = None
+        pending, self._pending = self._pending, {}
+        for section, changes in pending.items():
+            current = getattr(self.status, section) if self.status else None
+            settings = {}
+            if current is not None:
+                for field, key in zip(current._fields, current.API_KEYS):
+                    if key in WRITABLE_SETTINGS[section]:
+                        settings[key] = getattr(current, field)
+            settings.update(changes)
+            try:
+                await self.fleet.api.set_settings(
+                    self.vin, SETTINGS_DOMAINS[section], settings
+                )
+            except ApiError as err:
+                _LOGGER.error(
+                    "Error writing %s of %s: %s",
+                    SECTION_NAMES[section],
+                    self.vin,
+                    err,
+                )
+                self._async_drop_optimistic(section)
+            self.writes += 1
+        if pending:
+            await self.fleet.async_refresh_full(self.vin)
+
+    @callback
+    def _async_drop_optimistic(self, section: str) -> None:
+        """Show the polled values of a section again."""
+        for key in [key for key in self._optimistic if key[0] == section]:
+            del self._optimistic[key]
+
+    async def async_command(self, command: str, section: str, field: str, value: Any):
+        """Send a command, showing its expected result until confirmed.
+
+        command is the name of a libvwid.vwid method, e.g. 'start_charging'.
+        The refresh confirming it runs in the background.
+        """
+        self.async_set_optimistic(section, field, value)
+        try:
+            await getattr(self.fleet.api, command)(self.vin)
+        except ApiError as err:
+            self._async_drop_optimistic(section)
+            raise HomeAssistantError(f"Error sending {command}: {err}") from err
+        finally:
+            self.writes += 1
+        self.hass.async_create_task(self.fleet.async_refresh_full(self.vin))
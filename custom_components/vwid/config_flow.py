@@ -1,6 +1,22 @@
 from homeassistant import config_entries, core
-from .const import (DOMAIN, CONF_VIN)
-from homeassistant.const import (CONF_NAME, CONF_PASSWORD)
+from homeassistant.core import callback
+from .const import (
+    DOMAIN,
+    CONF_VIN,
+    CONF_ENERGY_PRICE,
+    CONF_FAST_INTERVAL,
+    CONF_MQTT_TOPIC,
+    CONF_PUSH_TRANSPORT,
+    CONF_SLOW_INTERVAL,
+    DEFAULT_ENERGY_PRICE,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_MQTT_TOPIC,
+    DEFAULT_SLOW_INTERVAL,
+    PUSH_NONE,
+    PUSH_TRANSPORTS,
+)
+from homeassistant.components import webhook
+from homeassistant.const import (CONF_NAME, CONF_PASSWORD, CONF_WEBHOOK_ID)
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 from typing import Any, Dict, Optional
@@ -9,7 +25,8 @@ CONFIG_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
         vol.Required(CONF_PASSWORD): cv.string,
-        vol.Required(CONF_VIN): cv.string,
+        # Leave empty to add every vehicle of the account
+        vol.Optional(CONF_VIN): cv.string,
     }
 )
 
@@ -25,3 +42,57 @@ class VwidConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return self.async_show_form(
             step_id="user", data_schema=CONFIG_SCHEMA, errors=errors
         )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return VwidOptionsFlow(config_entry)
+
+
+class VwidOptionsFlow(config_entries.OptionsFlow):
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input: Optional[Dict[str, Any]] = None):
+        """Set the polling interval bounds, the energy price and push source."""
+        errors: Dict[str, str] = {}
+
+        if user_input is not None:
+            if user_input[CONF_FAST_INTERVAL] > user_input[CONF_SLOW_INTERVAL]:
+                errors["base"] = "fast_above_slow"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        schema = vol.Schema(
+            {
+                vol.Required(
+                    CONF_FAST_INTERVAL,
+                    default=options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=10)),
+                vol.Required(
+                    CONF_SLOW_INTERVAL,
+                    default=options.get(CONF_SLOW_INTERVAL, DEFAULT_SLOW_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=10)),
+                vol.Required(
+                    CONF_ENERGY_PRICE,
+                    default=options.get(CONF_ENERGY_PRICE, DEFAULT_ENERGY_PRICE),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(
+                    CONF_PUSH_TRANSPORT,
+                    default=options.get(CONF_PUSH_TRANSPORT, PUSH_NONE),
+                ): vol.In(PUSH_TRANSPORTS),
+                vol.Required(
+                    CONF_MQTT_TOPIC,
+                    default=options.get(CONF_MQTT_TOPIC, DEFAULT_MQTT_TOPIC),
+                ): cv.string,
+                # Generated once, so the URL of the webhook stays the same
+                vol.Required(
+                    CONF_WEBHOOK_ID,
+                    default=options.get(CONF_WEBHOOK_ID) or webhook.async_generate_id(),
+                ): cv.string,
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
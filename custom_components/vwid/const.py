@@ -1,3 +1,31 @@
 DOMAIN = "vwid"
 
 CONF_VIN = "vin"
+CONF_FAST_INTERVAL = "fast_interval"
+CONF_SLOW_INTERVAL = "slow_interval"
+CONF_ENERGY_PRICE = "energy_price"
+CONF_PUSH_TRANSPORT = "push_transport"
+CONF_MQTT_TOPIC = "mqtt_topic"
+
+# Polling intervals in seconds, while the car is active and while it is parked
+DEFAULT_FAST_INTERVAL = 30
+DEFAULT_SLOW_INTERVAL = 600
+
+# Price per kWh of the charged energy, for the session cost sensors
+DEFAULT_ENERGY_PRICE = 0.0
+
+# Sources of pushed status documents, besides polling the API
+PUSH_NONE = "none"
+PUSH_MQTT = "mqtt"
+PUSH_WEBHOOK = "webhook"
+PUSH_TRANSPORTS = [PUSH_NONE, PUSH_MQTT, PUSH_WEBHOOK]
+
+# Pushed statuses are received on <topic>/<vin>/status
+DEFAULT_MQTT_TOPIC = DOMAIN
+
+DATA_CLIENTS = "clients"
+
+STORAGE_VERSION = 1
+STORAGE_KEY_TOKENS = DOMAIN + ".tokens.{}"
+STORAGE_KEY_METERS = DOMAIN + ".meters.{}"
+STORAGE_KEY_STATUS = DOMAIN + ".status.{}"
@@ -0,0 +1,471 @@
+"""Polling and pushed statuses of the vehicles of a config entry."""
+import asyncio
+from collections import Counter
+from functools import partial
+import logging
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+import aiohttp
+import async_timeout
+
+from homeassistant import config_entries, core
+from homeassistant.core import callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import (
+    CONF_ENERGY_PRICE,
+    CONF_FAST_INTERVAL,
+    CONF_SLOW_INTERVAL,
+    CONF_VIN,
+    DEFAULT_ENERGY_PRICE,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_SLOW_INTERVAL,
+    STORAGE_KEY_METERS,
+    STORAGE_KEY_STATUS,
+    STORAGE_KEY_TOKENS,
+    STORAGE_VERSION,
+)
+from .commands import VwIdCommander
+from .energy import ChargingMeter
+from .estimator import charge_finish
+from .history import VehicleHistory
+from .libvwid import UNCHANGED, ApiAuthError, ApiError, vwid
+from .model import SECTION_NAMES, VehicleStatus, parse_status, status_document
+from .transport import VwIdPollingTransport, VwIdPushTransport, create_push_transport
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for the vehicles of the account
+DISCOVERY_TIMEOUT = 30
+
+# Status requests in flight at the same time, per config entry
+MAX_PARALLEL_REQUESTS = 4
+
+# A plugged in car may start charging on a timer, so it is polled this many
+# times more often than a parked one, but never more often than an active one
+PLUGGED_IN_SPEEDUP = 4
+
+# While statuses are pushed, a vehicle is polled only this often, to notice
+# a push source that stopped
+PUSH_SAFETY_NET_INTERVAL = 3600
+
+# Polling intervals after which the charging meter does not integrate the
+# power over the gap since the previous status, e.g. after a restart
+METER_MAX_GAP_INTERVALS = 3
+
+# Status sections the fleet itself needs from every poll, for the polling
+# interval, the charging meter and the history, whatever entities are enabled
+FLEET_SECTIONS = frozenset(("battery", "charging", "plug", "climatisation"))
+
+
+def polling_interval(
+    status: Optional[VehicleStatus],
+    fast: float,
+    slow: float,
+    now: Optional[float] = None,
+) -> float:
+    """Return the seconds until the next poll, based on the last status."""
+    charging_state = climatisation_state = plug_state = None
+    if status is not None:
+        if status.charging is not None:
+            charging_state = status.charging.charging_state
+        if status.climatisation is not None:
+            climatisation_state = status.climatisation.climatisation_state
+        if status.plug is not None:
+            plug_state = status.plug.plug_connection_state
+
+    if climatisation_state not in (None, "off"):
+        return fast
+    if charging_state == "charging":
+        # The state of charge is estimated until charging is expected to
+        # finish, see estimator.estimate_soc, so instead of polling fast the
+        # car is polled at the predicted finish, or as if it were only
+        # plugged in to notice unpredicted changes
+        finish = charge_finish(status)
+        if finish is None:
+            return fast
+        until_finish = finish - (time.time() if now is None else now)
+        return max(min(until_finish, slow / PLUGGED_IN_SPEEDUP), fast)
+    if plug_state == "connected":
+        return max(slow / PLUGGED_IN_SPEEDUP, fast)
+    return slow
+
+
+class VwIdCoordinator(DataUpdateCoordinator):
+    """Coordinator of one vehicle, counting the state writes per refresh.
+
+    Entities skip the write when their state did not change, see
+    entity.VwIdEntity. When the update method returns libvwid.UNCHANGED,
+    the refresh ends right there, without notifying the entities at all.
+
+    The data is stale while it is the status saved by the last run, until
+    the first refresh succeeds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the coordinator."""
+        super().__init__(*args, **kwargs)
+        self.state_writes = 0
+        self.suppressed_writes = 0
+        self.skipped_refreshes = 0
+        self.stale = False
+        self._fetched = None
+        # Status sections read by the entities added to hass, see
+        # entity.VwIdEntity. Disabled entities are never added.
+        self.entity_sections = Counter()
+
+    @callback
+    def async_add_sections(self, sections: Iterable[str]) -> Callable[[], None]:
+        """Register the status sections an entity reads, until removed."""
+        sections = tuple(sections)
+        self.entity_sections.update(sections)
+
+        @callback
+        def remove_sections() -> None:
+            self.entity_sections.subtract(sections)
+
+        return remove_sections
+
+    def sections(self) -> Optional[FrozenSet[str]]:
+        """Return the status sections to fetch, or None for all of them.
+
+        Everything is fetched for the first status, which is fetched before
+        the entities are added, and to replace a stale one.
+        """
+        if self.data is None or self.stale:
+            return None
+        return FLEET_SECTIONS.union(
+            section for section, count in self.entity_sections.items() if count > 0
+        )
+
+    async def async_refresh(self) -> None:
+        """Refresh data and report how many state writes were needed."""
+        self.state_writes = 0
+        self.suppressed_writes = 0
+        if self.data is not None and self.last_update_success:
+            # Fetch ahead of the regular refresh, which is only run when
+            # there is something to tell the entities
+            try:
+                data = await self.update_method()
+            except Exception as err:  # pylint: disable=broad-except
+                self._fetched = (None, err)
+            else:
+                if data is UNCHANGED:
+                    self.skipped_refreshes += 1
+                    self.logger.debug(
+                        "%s: unchanged, %d refreshes skipped so far",
+                        self.name,
+                        self.skipped_refreshes,
+                    )
+                    return
+                self._fetched = (data, None)
+        await super().async_refresh()
+        self.logger.debug(
+            "%s: %d state writes, %d suppressed",
+            self.name,
+            self.state_writes,
+            self.suppressed_writes,
+        )
+
+    async def _async_update_data(self):
+        """Return the data fetched ahead, or fetch it now."""
+        if self._fetched is None:
+            data = await super()._async_update_data()
+        else:
+            (data, err), self._fetched = self._fetched, None
+            if err is not None:
+                raise err
+        # Before the entities are notified, so they drop the stale flag
+        self.stale = False
+        if data is UNCHANGED:
+            return self.data
+        return data
+
+
+class VwIdFleet:
+    """The vehicles of a config entry.
+
+    Every vehicle has its own coordinator, but all of them share one API
+    client and one polling transport, which polls each vehicle at an
+    interval depending on what it is doing. Statuses pushed by a push
+    transport are applied as they arrive, and polling then drops to
+    PUSH_SAFETY_NET_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        hass: core.HomeAssistant,
+        entry: config_entries.ConfigEntry,
+        api: vwid,
+    ):
+        """Initialize the fleet."""
+        self.hass = hass
+        self.entry = entry
+        self.api = api
+        self.vins: List[str] = []
+        self.coordinators: Dict[str, VwIdCoordinator] = {}
+        self.history: Dict[str, VehicleHistory] = {}
+        self.meters: Dict[str, ChargingMeter] = {}
+        self.commanders: Dict[str, VwIdCommander] = {}
+        self.polling = VwIdPollingTransport(self)
+        self.push: Optional[VwIdPushTransport] = None
+        # Loop time of the last pushed status of each vehicle
+        self.last_push: Dict[str, float] = {}
+        self._semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+        self._token_store = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY_TOKENS.format(entry.entry_id)
+        )
+        self._saved_tokens = None
+        self._meter_store = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY_METERS.format(entry.entry_id)
+        )
+        # Last status of every vehicle, to start with after a restart
+        self._status_store = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY_STATUS.format(entry.entry_id)
+        )
+        self._saved_vins: List[str] = []
+        self._discovery: Optional[asyncio.Task] = None
+        # Seconds from the start of the entry setup until all entities were
+        # added, see async_setup_entry
+        self.startup_duration = None
+
+    async def async_setup(self) -> None:
+        """Discover the vehicles and fetch their initial status.
+
+        Vehicles with a status saved by the last run start with it, marked
+        stale, and are refreshed in the background instead. In fleet mode,
+        the vehicles of the account are then listed in the background too.
+        """
+        stored = await self._status_store.async_load() or {}
+        stored_vins = stored.get("vins") or []
+        stored_status = stored.get("status") or {}
+        configured_vin = self.entry.data.get(CONF_VIN)
+        if configured_vin:
+            self.vins = [configured_vin]
+        elif stored_vins:
+            # Fleet mode with the vehicles of the last run: start with them
+            # and look for changes of the account in the background, below
+            self.vins = list(stored_vins)
+        else:
+            # Fleet mode: no VIN configured, so poll every vehicle of the account
+            self.vins = await self._async_discover()
+        self._saved_vins = list(self.vins)
+
+        # Restore the charging sessions, so they continue over a restart
+        stored_meters = await self._meter_store.async_load() or {}
+        for vin in self.vins:
+            self.meters[vin] = ChargingMeter.from_dict(stored_meters.get(vin, {}))
+
+        for vin in self.vins:
+            # No update interval, the fleet schedules the refreshes itself
+            self.coordinators[vin] = VwIdCoordinator(
+                self.hass,
+                _LOGGER,
+                name=f"VW ID {vin}",
+                update_method=partial(self._async_update_data, vin),
+            )
+            self.history[vin] = VehicleHistory()
+            self.commanders[vin] = VwIdCommander(self.hass, self, vin)
+
+        restored = [vin for vin in self.vins if vin in stored_status]
+        for vin in restored:
+            coordinator = self.coordinators[vin]
+            coordinator.data = parse_status(stored_status[vin])
+            coordinator.stale = True
+        await asyncio.gather(
+            *(
+                self.coordinators[vin].async_config_entry_first_refresh()
+                for vin in self.vins
+                if vin not in restored
+            )
+        )
+        for vin in self.vins:
+            self._async_record(vin)
+        await self.polling.async_start(due_now=restored)
+        if not configured_vin and stored_vins:
+            self._discovery = self.hass.async_create_task(
+                self._async_check_vehicles()
+            )
+        self.push = create_push_transport(self)
+        if self.push is not None:
+            await self.push.async_start()
+
+    async def _async_discover(self) -> List[str]:
+        """Return the VINs of the vehicles of the account."""
+        try:
+            async with async_timeout.timeout(DISCOVERY_TIMEOUT):
+                vehicles = await self.api.get_vehicles()
+        except (ApiError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise ConfigEntryNotReady(f"Error listing vehicles: {err}") from err
+        if not vehicles:
+            raise ConfigEntryNotReady("No vehicles found on the account")
+        return [vehicle["vin"] for vehicle in vehicles]
+
+    async def _async_check_vehicles(self) -> None:
+        """Reload the entry when the vehicles of the account changed."""
+        try:
+            vins = await self._async_discover()
+        except ConfigEntryNotReady as err:
+            _LOGGER.warning("%s, using the last known vehicles", err)
+            return
+        if set(vins) == set(self.vins):
+            return
+        _LOGGER.info("Vehicles of %s changed, reloading", self.entry.title)
+        # Saved first, so the reloaded entry starts with the new vehicles
+        self._saved_vins = vins
+        await self._status_store.async_save(self._status_data())
+        self.hass.async_create_task(
+            self.hass.config_entries.async_reload(self.entry.entry_id)
+        )
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Stop polling and receiving pushed statuses."""
+        if self._discovery is not None and not self._discovery.done():
+            self._discovery.cancel()
+        self.polling.async_stop()
+        if self.push is not None:
+            self.push.async_stop()
+        for commander in self.commanders.values():
+            commander.async_shutdown()
+
+    async def _async_update_data(self, vin: str):
+        """Fetch the status of one vehicle."""
+        coordinator = self.coordinators[vin]
+        sections = coordinator.sections()
+        async with self._semaphore:
+            # Note: asyncio.TimeoutError and aiohttp.ClientError are already
+            # handled by the data update coordinator.
+            try:
+                async with async_timeout.timeout(30):
+                    data = await self.api.get_status(
+                        vin,
+                        allow_unchanged=coordinator.data is not None,
+                        sections=(
+                            None
+                            if sections is None
+                            else sorted(SECTION_NAMES[field] for field in sections)
+                        ),
+                        caller=self.entry.entry_id,
+                    )
+            except ApiAuthError as err:
+                # Not raising ConfigEntryAuthFailed, as the login also fails
+                # while the identity server is down
+                raise UpdateFailed(f"Error authenticating: {err}") from err
+            except ApiError as err:
+                raise UpdateFailed(f"Error communicating with API: {err}") from err
+            finally:
+                self._async_save_tokens()
+                _LOGGER.debug("API statistics: %s", self.api.stats)
+
+        if data is UNCHANGED:
+            meter = self.meters[vin]
+            energy = meter.total_energy_kwh
+            self._async_meter(vin, coordinator.data)
+            if meter.total_energy_kwh != energy:
+                # Charging at a constant power: the status is the same, but
+                # the meter sensors moved on. The other entities skip their
+                # write, as their state did not change.
+                return coordinator.data
+            return data
+        # Parsed once here, so the entities only read tuple fields. Sections
+        # not fetched keep their last value.
+        status = parse_status(data, coordinator.data, sections)
+        # Before the entities are notified, so they show the new totals
+        self._async_meter(vin, status)
+        self._async_save_status()
+        return status
+
+    @callback
+    def _async_save_tokens(self) -> None:
+        """Persist the API tokens when they changed since the last save."""
+        tokens = self.api.tokens
+        if tokens and tokens is not self._saved_tokens:
+            self._saved_tokens = tokens
+            self._token_store.async_delay_save(lambda: {"tokens": tokens}, 10)
+
+    @callback
+    def _async_meter(self, vin: str, status: VehicleStatus) -> None:
+        """Add a polled status to the charging meter of a vehicle."""
+        price = self.entry.options.get(CONF_ENERGY_PRICE, DEFAULT_ENERGY_PRICE)
+        # Polled at the interval of the previous status, so a longer gap
+        # means polls were missed
+        max_gap = METER_MAX_GAP_INTERVALS * self.async_interval(vin)
+        self.meters[vin].add(time.time(), status, price, max_gap)
+        self._meter_store.async_delay_save(
+            lambda: {vin: meter.as_dict() for vin, meter in self.meters.items()}, 60
+        )
+
+    def _status_data(self) -> Dict[str, Any]:
+        """Return the vehicles and their last status, for the status store.
+
+        Vehicles new to the account are saved without a status, which they
+        get once they were polled.
+        """
+        status = {}
+        for vin in self._saved_vins:
+            coordinator = self.coordinators.get(vin)
+            if coordinator is not None and coordinator.data is not None:
+                status[vin] = status_document(coordinator.data)
+        return {"vins": self._saved_vins, "status": status}
+
+    @callback
+    def _async_save_status(self) -> None:
+        """Persist the last status of every vehicle, for the next start."""
+        self._status_store.async_delay_save(self._status_data, 60)
+
+    @callback
+    def _async_record(self, vin: str) -> None:
+        """Add the status of a vehicle to its history, if the poll succeeded."""
+        coordinator = self.coordinators[vin]
+        if (
+            coordinator.last_update_success
+            and coordinator.data is not None
+            and not coordinator.stale
+        ):
+            self.history[vin].add(time.time(), coordinator.data)
+
+    @callback
+    def async_interval(self, vin: str) -> float:
+        """Return the polling interval of a vehicle."""
+        options = self.entry.options
+        interval = polling_interval(
+            self.coordinators[vin].data,
+            options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL),
+            options.get(CONF_SLOW_INTERVAL, DEFAULT_SLOW_INTERVAL),
+        )
+        last_push = self.last_push.get(vin)
+        if (
+            last_push is not None
+            and self.hass.loop.time() - last_push < PUSH_SAFETY_NET_INTERVAL
+        ):
+            return max(interval, PUSH_SAFETY_NET_INTERVAL)
+        return interval
+
+    async def async_poll(self, vin: str) -> None:
+        """Poll the status of a vehicle, see transport.VwIdPollingTransport."""
+        await self.coordinators[vin].async_refresh()
+        self._async_record(vin)
+
+    @callback
+    def async_push(self, vin: str, payload: Dict[str, Any]) -> None:
+        """Apply a pushed status document, see transport.VwIdPushTransport."""
+        coordinator = self.coordinators[vin]
+        data = payload["data"]
+        fetched = [field for field, name in SECTION_NAMES.items() if name in data]
+        status = parse_status(payload, coordinator.data, fetched)
+        self.last_push[vin] = self.hass.loop.time()
+        self._async_meter(vin, status)
+        coordinator.stale = False
+        coordinator.async_set_updated_data(status)
+        self._async_save_status()
+        self._async_record(vin)
+        self.polling.async_reschedule(vin)
+
+    async def async_refresh_full(self, vin: str) -> None:
+        """Refresh a vehicle, decoding the status even when it is unchanged."""
+        self.api.status_digests.pop((self.entry.entry_id, vin), None)
+        await self.polling.async_refresh(vin)
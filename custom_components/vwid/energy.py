@@ -0,0 +1,94 @@
+"""Energy charged per session, integrated from the polled charge power."""
+from typing import Any, Dict, Optional
+
+from .model import VehicleStatus
+
+
+class ChargingMeter:
+    """Running energy and cost totals of one vehicle.
+
+    Every poll adds the trapezoid between the previous and the current
+    charge power, so an update is O(1) whatever the length of the session.
+    A session starts when the car is plugged in or starts charging, and
+    ends when it is unplugged; its totals are kept until the next one.
+    """
+
+    # Attributes saved to and loaded from storage
+    FIELDS = (
+        "session_energy_kwh",
+        "session_cost",
+        "session_start",
+        "session_active",
+        "total_energy_kwh",
+        "total_cost",
+        "last_time",
+        "last_power_kw",
+    )
+
+    def __init__(self):
+        """Initialize an empty meter."""
+        self.session_energy_kwh = 0.0
+        self.session_cost = 0.0
+        self.session_start: Optional[float] = None
+        self.session_active = False
+        self.total_energy_kwh = 0.0
+        self.total_cost = 0.0
+        self.last_time: Optional[float] = None
+        self.last_power_kw: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the state of the meter for storage."""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChargingMeter":
+        """Return a meter with the stored state."""
+        meter = cls()
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(meter, field, data[field])
+        return meter
+
+    def add(
+        self,
+        timestamp: float,
+        status: VehicleStatus,
+        price: float,
+        max_gap: Optional[float] = None,
+    ) -> None:
+        """Add a polled status, with the energy price per kWh.
+
+        Nothing is added for a gap of more than max_gap seconds since the
+        last status, e.g. over a restart, as the power in between is unknown.
+        """
+        charging = status.charging
+        power = None if charging is None else charging.charge_power_kw
+        charging_state = None if charging is None else charging.charging_state
+        plug_state = None if status.plug is None else status.plug.plug_connection_state
+
+        if (
+            self.session_active
+            and self.last_time is not None
+            and self.last_power_kw is not None
+            and power is not None
+            and timestamp > self.last_time
+            and (max_gap is None or timestamp - self.last_time <= max_gap)
+        ):
+            hours = (timestamp - self.last_time) / 3600
+            energy = (self.last_power_kw + power) / 2 * hours
+            self.session_energy_kwh += energy
+            self.total_energy_kwh += energy
+            self.session_cost += energy * price
+            self.total_cost += energy * price
+
+        if not self.session_active:
+            if plug_state == "connected" or charging_state == "charging":
+                self.session_active = True
+                self.session_start = timestamp
+                self.session_energy_kwh = 0.0
+                self.session_cost = 0.0
+        elif plug_state == "disconnected" and charging_state != "charging":
+            self.session_active = False
+
+        self.last_time = timestamp
+        self.last_power_kw = power
@@ -0,0 +1,145 @@
+"""Base entities of the integration."""
+from operator import attrgetter
+from typing import Any, Callable, Dict, Tuple
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .commands import OPTIMISTIC_TIMEOUT, VwIdCommander
+
+
+def path_getter(path: Tuple[str, str]) -> Callable[[Any], Any]:
+    """Return a function reading a field of a model.VehicleStatus.
+
+    A section missing in the last status, or no status at all, reads as None.
+    """
+    get_section = attrgetter(path[0])
+    get_field = attrgetter(path[1])
+
+    def get(status):
+        section = get_section(status) if status is not None else None
+        if section is None:
+            return None
+        return get_field(section)
+
+    return get
+
+
+class VwIdEntity(CoordinatorEntity):
+    """Entity that only writes its state when it changed.
+
+    status_sections are the model.VehicleStatus fields the entity reads.
+    Only the sections of the entities in use are fetched.
+
+    A status saved by the last run keeps the entity available, with the
+    attribute stale, until a refresh succeeds.
+    """
+
+    status_sections: Tuple[str, ...] = ()
+
+    def __init__(self, coordinator):
+        """Pass coordinator to CoordinatorEntity."""
+        super().__init__(coordinator)
+        self._written = None
+
+    @property
+    def available(self) -> bool:
+        """Return if the last refresh succeeded, or a saved status is shown."""
+        return super().available or self.coordinator.stale
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        """Return the attributes, flagging a stale status."""
+        attrs = dict(self.device_state_attributes or {})
+        if self.coordinator.stale:
+            attrs['stale'] = True
+        return attrs
+
+    def _state_snapshot(self):
+        """Return everything that ends up in the state machine."""
+        return (self.available, self.state, self.extra_state_attributes)
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_sections(self.status_sections)
+        )
+        # Written by the platform right after this
+        self._written = self._state_snapshot()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state, unless nothing changed since the last write."""
+        snapshot = self._state_snapshot()
+        if snapshot == self._written:
+            self.coordinator.suppressed_writes += 1
+            return
+        self._written = snapshot
+        self.coordinator.state_writes += 1
+        self.async_write_ha_state()
+
+
+class VwIdControlEntity(VwIdEntity):
+    """Entity changing a value of the vehicle.
+
+    It shows the value it set until the car reports it, see
+    commands.VwIdCommander.
+    """
+
+    def __init__(self, coordinator, commander: VwIdCommander, vin: str, name: str):
+        """Pass coordinator to CoordinatorEntity."""
+        super().__init__(coordinator)
+        self.commander = commander
+        self.vin = vin
+        self._name = name
+        self._entity_id = vin + "_" + name
+        self._unsub_expire = None
+
+    @property
+    def should_poll(self) -> bool:
+        """No need to poll. Coordinator notifies entity of updates."""
+        return False
+
+    @property
+    def name(self) -> str:
+        """Return the name of the entity."""
+        return self._name
+
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID of the entity."""
+        return self._entity_id
+
+    @property
+    def device_state_attributes(self) -> Dict[str, Any]:
+        return {'vin': self.vin}
+
+    def current(self, section: str, field: str) -> Any:
+        """Return the value set for a field, or else the polled one."""
+        polled = path_getter((section, field))(self.coordinator.data)
+        return self.commander.optimistic(section, field, polled)
+
+    @callback
+    def async_show_optimistic(self) -> None:
+        """Write the value set, and check again once it may have expired."""
+        self._handle_coordinator_update()
+        if self._unsub_expire:
+            self._unsub_expire()
+        self._unsub_expire = async_call_later(
+            self.hass, OPTIMISTIC_TIMEOUT, self._async_expire
+        )
+
+    @callback
+    def _async_expire(self, _now) -> None:
+        """Show the polled value, if the car did not confirm the one set."""
+        self._unsub_expire = None
+        self._handle_coordinator_update()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop waiting for the value set to expire."""
+        await super().async_will_remove_from_hass()
+        if self._unsub_expire:
+            self._unsub_expire()
+            self._unsub_expire = None
@@ -0,0 +1,58 @@
+"""Estimation of the state of charge between polls."""
+from datetime import datetime
+from typing import Optional
+
+from .model import VehicleStatus
+
+
+def captured_time(value: Optional[str]) -> Optional[float]:
+    """Return a carCapturedTimestamp as unix time."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def charge_finish(status: Optional[VehicleStatus]) -> Optional[float]:
+    """Return the unix time at which charging is expected to finish.
+
+    None when the car is not charging or does not tell the remaining time.
+    """
+    charging = None if status is None else status.charging
+    if charging is None or charging.charging_state != "charging":
+        return None
+    remaining = charging.remaining_charging_time_to_complete_min
+    captured = captured_time(charging.car_captured_timestamp)
+    if remaining is None or captured is None:
+        return None
+    return captured + remaining * 60
+
+
+def estimate_soc(status: Optional[VehicleStatus], now: float) -> Optional[float]:
+    """Return the state of charge at a time after the status was captured.
+
+    While charging, the state of charge is assumed to rise linearly from the
+    polled value to the target within the remaining charging time the car
+    reported. Otherwise it is the polled value.
+    """
+    battery = None if status is None else status.battery
+    soc = None if battery is None else battery.current_soc_pct
+    if soc is None:
+        return None
+    finish = charge_finish(status)
+    if finish is None:
+        return soc
+    # Known to be set, as charge_finish() needs it
+    captured = captured_time(status.charging.car_captured_timestamp)
+    if finish <= captured:
+        return soc
+
+    settings = status.charging_settings
+    target = None if settings is None else settings.target_soc_pct
+    target = 100 if target is None else target
+    if soc >= target:
+        return soc
+    progress = min(max((now - captured) / (finish - captured), 0), 1)
+    return round(soc + (target - soc) * progress, 1)
@@ -0,0 +1,119 @@
+"""Recent history of the numeric vehicle values, kept in memory.
+
+Dashboards and derived sensors can read the last hours of a vehicle from
+here instead of querying the recorder database.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .model import VehicleStatus
+
+# Name of each series and its (section, field) in model.VehicleStatus
+HISTORY_FIELDS = (
+    ("soc_pct", ("battery", "current_soc_pct")),
+    ("range_km", ("battery", "cruising_range_electric_km")),
+    ("charge_power_kw", ("charging", "charge_power_kw")),
+    ("charge_rate_kmph", ("charging", "charge_rate_kmph")),
+)
+
+# A day of samples at the default fast polling interval
+DEFAULT_CAPACITY = 2880
+
+
+def field_value(status: VehicleStatus, path: Tuple[str, str]) -> float:
+    """Return a numeric field of a status, or NaN when it is missing."""
+    section = getattr(status, path[0])
+    value = None if section is None else getattr(section, path[1])
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def json_value(value: float) -> Optional[float]:
+    """Return a sample as JSON can hold it."""
+    return None if math.isnan(value) else value
+
+
+class VehicleHistory:
+    """Ring buffer of timestamped samples of one vehicle.
+
+    Every series is a preallocated array of doubles, so a sample costs a few
+    stores and the buffer never grows. Missing values are stored as NaN.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """Initialize the buffer."""
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.series = {name: array("d", [0.0]) * capacity for name, _ in HISTORY_FIELDS}
+        self.length = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        """Return the number of samples held."""
+        return self.length
+
+    def add(self, timestamp: float, status: VehicleStatus) -> None:
+        """Add a sample of a status, overwriting the oldest when full."""
+        index = self._next
+        self.times[index] = timestamp
+        for name, path in HISTORY_FIELDS:
+            self.series[name][index] = field_value(status, path)
+        self._next = (index + 1) % self.capacity
+        self.length = min(self.length + 1, self.capacity)
+
+    def _ordered(self, values: array) -> array:
+        """Return the samples of an array from the oldest to the newest."""
+        if self.length < self.capacity:
+            return values[: self.length]
+        return values[self._next :] + values[: self._next]
+
+    def window(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Dict[str, List[Optional[float]]]:
+        """Return the samples taken from start to end, both inclusive."""
+        times = self._ordered(self.times)
+        first = 0 if start is None else bisect_left(times, start)
+        last = len(times) if end is None else bisect_right(times, end)
+        result = {"time": times[first:last].tolist()}
+        for name, _ in HISTORY_FIELDS:
+            values = self._ordered(self.series[name])[first:last]
+            result[name] = [json_value(value) for value in values]
+        return result
+
+    def downsample(
+        self,
+        points: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Dict[str, List[Optional[float]]]:
+        """Return at most points averages over equal time buckets.
+
+        The time of a bucket is the mean time of its samples; missing values
+        are left out of the averages and buckets without samples are dropped.
+        """
+        samples = self.window(start, end)
+        times = samples["time"]
+        if len(times) <= points:
+            return samples
+
+        begin = times[0]
+        width = (times[-1] - begin) / points or 1
+        buckets: Dict[int, List[int]] = {}
+        for index, timestamp in enumerate(times):
+            buckets.setdefault(min(int((timestamp - begin) / width), points - 1), []).append(
+                index
+            )
+
+        result: Dict[str, List[Optional[float]]] = {"time": []}
+        for name, _ in HISTORY_FIELDS:
+            result[name] = []
+        for indices in buckets.values():
+            result["time"].append(sum(times[i] for i in indices) / len(indices))
+            for name, _ in HISTORY_FIELDS:
+                values = [samples[name][i] for i in indices if samples[name][i] is not None]
+                result[name].append(sum(values) / len(values) if values else None)
+        return result
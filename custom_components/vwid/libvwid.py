@@ -5,27 +5,233 @@
 # Jon Petter Skagmo, 2021
 
 import secrets
-import lxml.html
 import logging
 import aiohttp
 import asyncio
+import base64
+import collections
+import email.utils
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from html.parser import HTMLParser
 
 # Constants
 LOGIN_BASE = "https://login.apps.emea.vwapps.io"
 LOGIN_HANDLER_BASE = "https://identity.vwgroup.io"
 API_BASE = "https://mobileapi.apps.emea.vwapps.io"
 
+# Refresh the access token this many seconds before it expires
+REFRESH_MARGIN = 120
+
+# Retries of a request answered with 429 or 5xx, with jittered exponential
+# backoff starting at BACKOFF_BASE seconds. A longer Retry-After than
+# BACKOFF_MAX is not waited for, but pauses all requests instead.
+MAX_RETRIES = 2
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 10.0
+
+# Consecutive server errors after which all requests are paused
+CIRCUIT_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 300
+
+# Requests timed per endpoint, and the number of latest samples the latency
+# percentiles are computed from
+ENDPOINTS = ('authorize', 'email', 'password', 'terms', 'redirect', 'login', 'refresh', 'vehicles', 'status', 'command', 'settings')
+METRICS_WINDOW = 200
+
+# Connection pool of the client's own session. Idle connections are kept
+# open for longer than the fast polling interval, so polls reuse them.
+CONNECTION_LIMIT = 10
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+# Headers sent with every request to the API, besides the Authorization
+REQUEST_HEADERS = {
+	'Accept': 'application/json',
+	'Accept-Encoding': 'gzip',
+}
+
+# Returned by get_status() instead of the status when the response body is
+# identical to the previous one of the vehicle
+UNCHANGED = object()
+
+class ApiError(Exception):
+	def __init__(self, message, status=None):
+		super().__init__(message)
+		self.status = status
+
+class ApiAuthError(ApiError):
+	pass
+
+class ApiCircuitOpen(ApiError):
+	def __init__(self, message, retry_at):
+		super().__init__(message)
+		# Monotonic time at which requests are allowed again
+		self.retry_at = retry_at
+
+def retry_after(response):
+	# Retry-After is either a number of seconds or an HTTP date
+	value = response.headers.get('Retry-After')
+	if not value:
+		return None
+	try:
+		return max(float(value), 0)
+	except ValueError:
+		pass
+	try:
+		return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+	except (TypeError, ValueError):
+		return None
+
+def backoff(attempt):
+	# Full jitter, so clients polling in lockstep spread out
+	return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+# Start and end of the login form, to parse only that part of a page
+FORM_START = re.compile(rb'<form[\s>]', re.IGNORECASE)
+FORM_END = re.compile(rb'</form\s*>', re.IGNORECASE)
+
+class LoginFormParser(HTMLParser):
+	# Collects the hidden inputs and the action of the first form on a page,
+	# without building a DOM
+	def __init__(self):
+		super().__init__()
+		self.form = {}
+		self.action = None
+		self.in_form = False
+		self.done = False
+
+	def handle_starttag(self, tag, attrs):
+		if self.done:
+			return
+		if tag == 'form':
+			self.in_form = True
+			self.action = dict(attrs).get('action')
+		elif tag == 'input' and self.in_form:
+			attrs = dict(attrs)
+			if attrs.get('type') == 'hidden' and attrs.get('name'):
+				self.form[attrs['name']] = attrs.get('value') or ''
+
+	def handle_endtag(self, tag):
+		if tag == 'form' and self.in_form:
+			self.in_form = False
+			self.done = True
+
+def parse_login_form(page):
+	if isinstance(page, str):
+		page = page.encode('utf-8')
+
+	# Skip everything before and after the first form instead of parsing the
+	# whole page
+	start = FORM_START.search(page)
+	if start is None:
+		return ({}, None)
+	end = FORM_END.search(page, start.start())
+	snippet = page[start.start():(end.end() if end else len(page))]
+
+	parser = LoginFormParser()
+	parser.feed(snippet.decode('utf-8', errors='replace'))
+	parser.close()
+	return (parser.form, parser.action)
+
+def token_expiry(token):
+	# The tokens are JWTs, with the expiry as unix time in the payload
+	try:
+		payload = token.split('.')[1]
+		payload += '=' * (-len(payload) % 4)
+		return json.loads(base64.urlsafe_b64decode(payload))['exp']
+	except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+		return None
+
+class EndpointMetrics:
+	# Request count, failures and recent latencies of one endpoint
+	def __init__(self):
+		self.count = 0
+		self.failures = 0
+		self.latencies = collections.deque(maxlen=METRICS_WINDOW)
+		# Connections opened for and reused by requests of the endpoint, as
+		# seen by the client's own session
+		self.connections_created = 0
+		self.connections_reused = 0
+
+	def add(self, seconds, failed):
+		self.count += 1
+		if failed:
+			self.failures += 1
+		self.latencies.append(seconds)
+
+	def percentile(self, percent):
+		# Nearest rank, in seconds, or None without samples
+		if not self.latencies:
+			return None
+		ordered = sorted(self.latencies)
+		rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+		return ordered[min(rank, len(ordered) - 1)]
+
+def connection_trace(metrics):
+	# Count new and reused connections per endpoint, named in the
+	# trace_request_ctx of each request
+	async def on_create(session, context, params):
+		endpoint = (context.trace_request_ctx or {}).get('endpoint')
+		if endpoint in metrics:
+			metrics[endpoint].connections_created += 1
+
+	async def on_reuse(session, context, params):
+		endpoint = (context.trace_request_ctx or {}).get('endpoint')
+		if endpoint in metrics:
+			metrics[endpoint].connections_reused += 1
+
+	trace = aiohttp.TraceConfig()
+	trace.on_connection_create_end.append(on_create)
+	trace.on_connection_reuseconn.append(on_reuse)
+	return trace
+
 class vwid:
-	def __init__(self, session):
+	def __init__(self, session=None):
+		# Without a session, the client creates its own on first use, so the
+		# login cookies stay out of any shared cookie jar
 		self.session = session
-		self.headers = {}
+		self.own_session = session is None
+		self.vin = None
+		self.set_base_urls(LOGIN_BASE, LOGIN_HANDLER_BASE, API_BASE)
+		self.headers = dict(REQUEST_HEADERS)
+		self.tokens = None
+		self.token_expires = None
+		self.refresh_timer = None
+		self.refresh_task = None
+		self.auth_task = None
+		self.stats = {
+			'requests': 0,
+			'retried_requests': 0,
+			'token_refreshes': 0,
+			'proactive_refreshes': 0,
+			'reconnects': 0,
+			'server_errors': 0,
+			'backoff_retries': 0,
+			'circuit_opens': 0,
+			'unchanged_responses': 0,
+			'failed_refreshes': 0,
+			'failed_reconnects': 0,
+		}
+		self.metrics = {endpoint: EndpointMetrics() for endpoint in ENDPOINTS}
+		# Digest of the last status body per caller and VIN
+		self.status_digests = {}
+		self.consecutive_server_errors = 0
+		self.circuit_open_until = 0
 		self.log = logging.getLogger(__name__)
 
 	def form_from_response(self, text):
-		page = lxml.html.fromstring(text)
-		elements = page.xpath('//form//input[@type="hidden"]')
-		form = {x.attrib['name']: x.attrib['value'] for x in elements}
-		return (form, page.forms[0].action)
+		return parse_login_form(text)
+
+	def set_base_urls(self, login_base, login_handler_base, api_base):
+		# Only changed to talk to a stand-in server, see tests/vwcloud.py
+		self.login_base = login_base
+		self.login_handler_base = login_handler_base
+		self.api_base = api_base
 
 	def set_vin(self, vin):
 		self.vin = vin
@@ -33,48 +239,93 @@ class vwid:
 	def set_credentials(self, username, password):
 		self.username = username
 		self.password = password
+
+	def set_tokens(self, tokens):
+		# Tokens saved from an earlier session, see resume()
+		self.tokens = tokens
 		
 	async def connect(self, username, password):
 		self.set_credentials(username, password)
 		return (await self.reconnect())
 
+	def create_session(self):
+		connector = aiohttp.TCPConnector(
+			limit=CONNECTION_LIMIT,
+			keepalive_timeout=KEEPALIVE_TIMEOUT,
+			use_dns_cache=True,
+			ttl_dns_cache=DNS_CACHE_TTL,
+		)
+		return aiohttp.ClientSession(
+			connector=connector,
+			headers={'Accept-Encoding': 'gzip'},
+			trace_configs=[connection_trace(self.metrics)],
+		)
+
+	async def close_session(self):
+		if self.own_session and self.session is not None:
+			await self.session.close()
+			self.session = None
+
+	async def fetch(self, endpoint, method, url, **kwargs):
+		# Send a request and read the whole response within a context
+		# manager, so its connection always goes back to the pool. Returns
+		# the released response and its body.
+		if self.session is None:
+			self.session = self.create_session()
+		start = time.monotonic()
+		try:
+			async with self.session.request(method, url, trace_request_ctx={'endpoint': endpoint}, **kwargs) as response:
+				body = await response.read()
+		except Exception:
+			self.metrics[endpoint].add(time.monotonic() - start, True)
+			raise
+		self.metrics[endpoint].add(time.monotonic() - start, response.status >= 400)
+		return (response, body)
+
 	async def reconnect(self):
+		self.stats['reconnects'] += 1
+		if await self.login():
+			return True
+		self.stats['failed_reconnects'] += 1
+		return False
+
+	async def login(self):
 		# Get authorize page
 		payload = {
 			'nonce': secrets.token_urlsafe(12), 
 			'redirect_uri': 'weconnect://authenticated'
 		}
 
-		response = await self.session.get(LOGIN_BASE + '/authorize', params=payload)
+		(response, body) = await self.fetch('authorize', 'GET', self.login_base + '/authorize', params=payload)
 		if response.status >= 400:
 			# Non 2xx response, failed
 			return False
 
 		# Fill form with email (username)
-		(form, action) = self.form_from_response(await response.read())
+		(form, action) = self.form_from_response(body)
 		form['email'] = self.username
-		response = await self.session.post(LOGIN_HANDLER_BASE+action, data=form)
+		(response, body) = await self.fetch('email', 'POST', self.login_handler_base + action, data=form)
 		if response.status >= 400:
 			self.log.error("Email fail")
 			return False
 			
 		# Fill form with password
-		(form, action) = self.form_from_response(await response.read())
+		(form, action) = self.form_from_response(body)
 		form['password'] = self.password
-		url = LOGIN_HANDLER_BASE + action
-		response = await self.session.post(url, data=form, allow_redirects=False)
+		url = self.login_handler_base + action
+		(response, body) = await self.fetch('password', 'POST', url, data=form, allow_redirects=False)
 
 		# Can get a 303 redirect for a "terms and conditions" page
 		if (response.status == 303):
 			url = response.headers['Location']
 			if ("terms-and-conditions" in url):
 				# Get terms and conditions page
-				url = LOGIN_HANDLER_BASE + url
-				response = await self.session.get(url, data=form, allow_redirects=False)
+				url = self.login_handler_base + url
+				(response, body) = await self.fetch('terms', 'GET', url, data=form, allow_redirects=False)
 
-				(form, action) = self.form_from_response(await response.read())
-				url = LOGIN_HANDLER_BASE + action
-				response = await self.session.post(url, data=form, allow_redirects=False)
+				(form, action) = self.form_from_response(body)
+				url = self.login_handler_base + action
+				(response, body) = await self.fetch('terms', 'POST', url, data=form, allow_redirects=False)
 
 				self.log.warn("Agreed to terms and conditions")
 			else:
@@ -98,9 +349,7 @@ class vwid:
 				self.log.error("Not redirected, status %u" % response.status)
 				return False
 
-			response = await self.session.get(url, data=form, allow_redirects=False)
-
-		self.headers = dict(response.headers)
+			(response, body) = await self.fetch('redirect', 'GET', url, data=form, allow_redirects=False)
 
 		# Get final token
 		payload = {
@@ -111,53 +360,246 @@ class vwid:
 			'access_token': query["access_token"],
 			'authorizationCode': query["code"]
 		}
-		response = await self.session.post(LOGIN_BASE + '/login/v1', json=payload)
+		(response, body) = await self.fetch('login', 'POST', self.login_base + '/login/v1', json=payload)
 		if response.status >= 400:
 			self.log.error("Login failed")
 			# Non 2xx response, failed
 			return False
-		self.tokens = await response.json()
-
 		# Update header with final token
-		self.headers['Authorization'] = 'Bearer %s' % self.tokens["accessToken"]
+		self.use_tokens(json.loads(body))
 
 		# Success
 		return True
+
+	def use_tokens(self, tokens):
+		# self.headers is replaced, never modified, so requests can keep
+		# using the snapshot they were started with
+		self.tokens = tokens
+		headers = dict(REQUEST_HEADERS)
+		headers['Authorization'] = 'Bearer %s' % self.tokens["accessToken"]
+		self.headers = headers
+		self.token_expires = token_expiry(self.tokens["accessToken"])
+		self.schedule_refresh()
+
+	def token_valid(self):
+		return (self.token_expires is not None) and (time.time() < self.token_expires - REFRESH_MARGIN)
+
+	def schedule_refresh(self):
+		if self.refresh_timer:
+			self.refresh_timer.cancel()
+			self.refresh_timer = None
+		if self.token_expires is None:
+			return
+
+		delay = max(self.token_expires - REFRESH_MARGIN - time.time(), 0)
+		self.refresh_timer = asyncio.get_running_loop().call_later(delay, self.start_proactive_refresh)
+
+	def start_proactive_refresh(self):
+		self.refresh_timer = None
+		self.refresh_task = asyncio.ensure_future(self.proactive_refresh())
+
+	async def proactive_refresh(self):
+		# Refresh in the background, so polls never go out with an expired token
+		self.stats['proactive_refreshes'] += 1
+		self.log.debug("Refreshing tokens before expiry")
+		# Nobody awaits this task, so its errors are only logged. The next
+		# poll authenticates again anyway.
+		try:
+			await self.authenticate()
+		except (ApiError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+			self.log.warning("Refreshing tokens before expiry failed: %s", err)
+
+	def close(self):
+		if self.refresh_timer:
+			self.refresh_timer.cancel()
+			self.refresh_timer = None
+		if self.refresh_task:
+			self.refresh_task.cancel()
+			self.refresh_task = None
+		if self.auth_task:
+			self.auth_task.cancel()
+			self.auth_task = None
+
+	def authenticate(self, rejected=None):
+		# Single flight: while a refresh or login is running, every other
+		# caller awaits the same task instead of starting its own.
+		# rejected is the header snapshot a failed request was sent with; if
+		# the headers were replaced since, someone else already authenticated.
+		if (rejected is not None) and (rejected is not self.headers) and ('Authorization' in self.headers):
+			future = asyncio.get_running_loop().create_future()
+			future.set_result(True)
+			return future
+
+		if (self.auth_task is None) or self.auth_task.done():
+			self.auth_task = asyncio.ensure_future(self.refresh_or_reconnect())
+
+		# Shielded, so a caller timing out does not abort the shared login
+		return asyncio.shield(self.auth_task)
+
+	async def refresh_or_reconnect(self):
+		# Restored tokens only need a single request to the refresh endpoint,
+		# so try them before running the whole login chain
+		if await self.refresh_tokens():
+			return True
+
+		self.log.info("Reconnecting")
+		return (await self.reconnect())
+
+	async def resume(self):
+		# A restored access token can be used as is while it is still valid
+		if self.tokens and (token_expiry(self.tokens.get("accessToken")) or 0) > time.time() + REFRESH_MARGIN:
+			self.use_tokens(self.tokens)
+			return True
+
+		return (await self.authenticate())
 		
 	async def refresh_tokens(self):
-		if not self.headers:
+		if not self.tokens:
 			return False
 
+		self.stats['token_refreshes'] += 1
+
 		# Use the refresh token
-		self.headers['Authorization'] = 'Bearer %s' % self.tokens["refreshToken"]
+		headers = dict(self.headers)
+		headers['Authorization'] = 'Bearer %s' % self.tokens["refreshToken"]
 		
-		response = await self.session.get(LOGIN_BASE + '/refresh/v1', headers=self.headers)
+		(response, body) = await self.fetch('refresh', 'GET', self.login_base + '/refresh/v1', headers=headers)
 		if response.status >= 400:
+			self.stats['failed_refreshes'] += 1
 			return False
-		self.tokens = await response.json()
 		
 		# Use the newly received access token
-		self.headers['Authorization'] = 'Bearer %s' % self.tokens["accessToken"]
+		self.use_tokens(json.loads(body))
 
 		return True
 
-	async def get_status(self):
-		response = await self.session.get(API_BASE + "/vehicles/" + self.vin + "/status", headers=self.headers)
+	def open_circuit(self, seconds):
+		self.stats['circuit_opens'] += 1
+		self.circuit_open_until = max(self.circuit_open_until, time.monotonic() + seconds)
+		self.log.warning("Pausing requests for %.0f s", seconds)
+		return ApiCircuitOpen("Requests paused after server errors", self.circuit_open_until)
 
-		# If first attempt fails, try to refresh tokens
-		if response.status >= 400:
-			self.log.debug("Refreshing tokens")
-			if await self.refresh_tokens():
-				response = await self.session.get(API_BASE + "/vehicles/" + self.vin + "/status", headers=self.headers)
-			
-		# If refreshing tokens failed, try a full reconnect
-		if response.status >= 400:
-			self.log.info("Reconnecting")
-			if await self.reconnect():
-				response = await self.session.get(API_BASE + "/vehicles/" + self.vin + "/status", headers=self.headers)
-			
-		if response.status >= 400:
-			self.log.error("Get status failed")
-			return {}
-			
-		return (await response.json())
+	async def request(self, method, url, endpoint, **kwargs):
+		# Requests are paused after repeated server errors, see open_circuit()
+		if time.monotonic() < self.circuit_open_until:
+			raise ApiCircuitOpen("Requests paused after server errors", self.circuit_open_until)
+
+		auth_retried = False
+		attempt = 0
+		while True:
+			headers = self.headers
+			self.stats['requests'] += 1
+			(response, body) = await self.fetch(endpoint, method, url, headers=headers, **kwargs)
+
+			# Rejected token: refresh tokens or reconnect, and try once more
+			if response.status in (401, 403):
+				if auth_retried:
+					raise ApiAuthError("Request rejected after authenticating", response.status)
+				auth_retried = True
+				self.stats['retried_requests'] += 1
+				self.log.debug("Refreshing tokens")
+				if not await self.authenticate(headers):
+					raise ApiAuthError("Authentication failed", response.status)
+				continue
+
+			# Rate limited or server error: back off, the tokens are fine
+			if response.status == 429 or response.status >= 500:
+				self.stats['server_errors'] += 1
+				self.consecutive_server_errors += 1
+				if self.consecutive_server_errors >= CIRCUIT_THRESHOLD:
+					self.consecutive_server_errors = 0
+					raise self.open_circuit(retry_after(response) or CIRCUIT_COOLDOWN)
+
+				delay = retry_after(response)
+				if delay is not None and delay > BACKOFF_MAX:
+					raise self.open_circuit(delay)
+				if attempt >= MAX_RETRIES:
+					raise ApiError("Server error %u" % response.status, response.status)
+
+				delay = backoff(attempt) if delay is None else delay
+				attempt += 1
+				self.stats['backoff_retries'] += 1
+				self.log.debug("Server error %u, retrying in %.1f s", response.status, delay)
+				await asyncio.sleep(delay)
+				continue
+
+			if response.status >= 400:
+				raise ApiError("Request failed with status %u" % response.status, response.status)
+
+			self.consecutive_server_errors = 0
+			return (response, body)
+
+	async def call(self, method, url, endpoint, **kwargs):
+		# Not authenticated yet (e.g. after a restart), so a request would
+		# fail anyway
+		if not 'Authorization' in self.headers:
+			if not await self.resume():
+				raise ApiAuthError("Not authenticated")
+
+		# Normally refreshed in the background already, but the timer can be
+		# late (e.g. after the host was suspended)
+		if self.token_expires is not None and not self.token_valid():
+			self.log.debug("Refreshing expiring tokens")
+			await self.authenticate(self.headers)
+
+		return (await self.request(method, url, endpoint, **kwargs))
+
+	async def get_json(self, url, endpoint):
+		(response, body) = await self.call('GET', url, endpoint)
+		return json.loads(body)
+
+	async def get_vehicles(self):
+		vehicles = await self.get_json(self.api_base + "/vehicles", 'vehicles')
+		return vehicles.get('data', [])
+
+	async def get_status(self, vin=None, allow_unchanged=False, sections=None, caller=None):
+		# A client shared by several vehicles is given the VIN per call
+		vin = vin or self.vin
+
+		# Only the given status sections (e.g. 'batteryStatus') are asked
+		# for, instead of the whole document
+		params = {'jobs': ','.join(sections)} if sections else None
+
+		(response, body) = await self.call('GET', self.api_base + "/vehicles/" + vin + "/status", 'status', params=params)
+
+		# A parked car mostly returns the same body again, which then needs
+		# no decoding at all. Only callers still holding the previous status
+		# can make sense of UNCHANGED, so they have to ask for it. A client
+		# shared by several callers (e.g. config entries of the same account)
+		# keeps the digests of each of them apart.
+		digest = hashlib.blake2b(body, digest_size=16).digest()
+		key = (caller, vin)
+		if allow_unchanged and self.status_digests.get(key) == digest:
+			self.stats['unchanged_responses'] += 1
+			return UNCHANGED
+		self.status_digests[key] = digest
+		return json.loads(body)
+
+	async def send_command(self, vin, command):
+		# e.g. 'charging/start', answered without a body worth reading
+		vin = vin or self.vin
+		await self.call('POST', self.api_base + "/vehicles/" + vin + "/" + command, 'command')
+
+	async def start_charging(self, vin=None):
+		await self.send_command(vin, 'charging/start')
+
+	async def stop_charging(self, vin=None):
+		await self.send_command(vin, 'charging/stop')
+
+	async def start_climatisation(self, vin=None):
+		await self.send_command(vin, 'climatisation/start')
+
+	async def stop_climatisation(self, vin=None):
+		await self.send_command(vin, 'climatisation/stop')
+
+	async def set_settings(self, vin, section, settings):
+		# section is 'charging' or 'climatisation', settings the API keys of
+		# its settings section (e.g. {'targetSOC_pct': 80})
+		vin = vin or self.vin
+		await self.call('PUT', self.api_base + "/vehicles/" + vin + "/" + section + "/settings", 'settings', json=settings)
+
+	async def set_charging_settings(self, settings, vin=None):
+		await self.set_settings(vin, 'charging', settings)
+
+	async def set_climatisation_settings(self, settings, vin=None):
+		await self.set_settings(vin, 'climatisation', settings)
@@ -0,0 +1,152 @@
+"""Compact typed model of the vehicle status.
+
+Only the fields the integration uses are kept from the status document.
+Each section is a NamedTuple listing the API key of every field in
+API_KEYS, so a section is parsed with a single tuple construction.
+"""
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+
+class BatteryStatus(NamedTuple):
+    current_soc_pct: Optional[int]
+    cruising_range_electric_km: Optional[int]
+
+    API_KEYS = ("currentSOC_pct", "cruisingRangeElectric_km")
+
+
+class ChargingStatus(NamedTuple):
+    remaining_charging_time_to_complete_min: Optional[int]
+    charging_state: Optional[str]
+    charge_mode: Optional[str]
+    charge_power_kw: Optional[float]
+    charge_rate_kmph: Optional[float]
+    car_captured_timestamp: Optional[str]
+
+    API_KEYS = (
+        "remainingChargingTimeToComplete_min",
+        "chargingState",
+        "chargeMode",
+        "chargePower_kW",
+        "chargeRate_kmph",
+        "carCapturedTimestamp",
+    )
+
+
+class ChargingSettings(NamedTuple):
+    max_charge_current_ac: Optional[str]
+    auto_unlock_plug_when_charged: Optional[str]
+    target_soc_pct: Optional[int]
+
+    API_KEYS = ("maxChargeCurrentAC", "autoUnlockPlugWhenCharged", "targetSOC_pct")
+
+
+class PlugStatus(NamedTuple):
+    plug_connection_state: Optional[str]
+    plug_lock_state: Optional[str]
+
+    API_KEYS = ("plugConnectionState", "plugLockState")
+
+
+class ClimatisationStatus(NamedTuple):
+    remaining_climatisation_time_min: Optional[int]
+    climatisation_state: Optional[str]
+
+    API_KEYS = ("remainingClimatisationTime_min", "climatisationState")
+
+
+class ClimatisationSettings(NamedTuple):
+    target_temperature_k: Optional[float]
+    target_temperature_c: Optional[float]
+    target_temperature_f: Optional[float]
+    climatisation_without_external_power: Any
+    climatization_at_unlock: Any
+    window_heating_enabled: Any
+    zone_front_left_enabled: Any
+    zone_front_right_enabled: Any
+
+    API_KEYS = (
+        "targetTemperature_K",
+        "targetTemperature_C",
+        "targetTemperature_F",
+        "climatisationWithoutExternalPower",
+        "climatizationAtUnlock",
+        "windowHeatingEnabled",
+        "zoneFrontLeftEnabled",
+        "zoneFrontRightEnabled",
+    )
+
+
+class VehicleStatus(NamedTuple):
+    """Status of a vehicle, with None for sections missing in the response."""
+
+    battery: Optional[BatteryStatus]
+    charging: Optional[ChargingStatus]
+    charging_settings: Optional[ChargingSettings]
+    plug: Optional[PlugStatus]
+    climatisation: Optional[ClimatisationStatus]
+    climatisation_settings: Optional[ClimatisationSettings]
+
+
+# Status document section of each VehicleStatus field, in field order
+SECTIONS = (
+    ("batteryStatus", BatteryStatus),
+    ("chargingStatus", ChargingStatus),
+    ("chargingSettings", ChargingSettings),
+    ("plugStatus", PlugStatus),
+    ("climatisationStatus", ClimatisationStatus),
+    ("climatisationSettings", ClimatisationSettings),
+)
+
+# Status document section of each VehicleStatus field by field name
+SECTION_NAMES = dict(zip(VehicleStatus._fields, (name for name, _ in SECTIONS)))
+SECTION_TYPES = dict(zip(VehicleStatus._fields, (type_ for _, type_ in SECTIONS)))
+
+
+def api_key(section: str, field: str) -> str:
+    """Return the API key of a field, e.g. targetSOC_pct of target_soc_pct."""
+    section_type = SECTION_TYPES[section]
+    return section_type.API_KEYS[section_type._fields.index(field)]
+
+
+def parse_section(section_type, section: Any):
+    """Return the section as a tuple, or None when it is missing."""
+    if not isinstance(section, dict):
+        return None
+    return section_type._make(section.get(key) for key in section_type.API_KEYS)
+
+
+def status_document(status: VehicleStatus) -> Dict[str, Any]:
+    """Return a status as a status document of the API, for parse_status."""
+    return {
+        "data": {
+            name: dict(zip(section_type.API_KEYS, section))
+            for (name, section_type), section in zip(SECTIONS, status)
+            if section is not None
+        }
+    }
+
+
+def parse_status(
+    payload: Dict[str, Any],
+    previous: Optional[VehicleStatus] = None,
+    fetched: Optional[Iterable[str]] = None,
+) -> VehicleStatus:
+    """Parse a status document of the API.
+
+    When only the fetched fields were asked for, the other fields are taken
+    from the previous status.
+    """
+    data = payload.get("data") or {}
+    status = VehicleStatus._make(
+        parse_section(section_type, data.get(name))
+        for name, section_type in SECTIONS
+    )
+    if previous is not None and fetched is not None:
+        status = status._replace(
+            **{
+                field: getattr(previous, field)
+                for field in VehicleStatus._fields
+                if field not in fetched
+            }
+        )
+    return status
@@ -0,0 +1,86 @@
+"""Number entities changing the settings of a vehicle."""
+from dataclasses import dataclass
+from typing import Optional
+
+from homeassistant import config_entries, core
+from homeassistant.components.number import NumberEntity
+
+from .const import DOMAIN
+from .entity import VwIdControlEntity
+
+
+@dataclass(frozen=True)
+class VwIdNumberDescription:
+    """Describes a setting changed by a number entity."""
+
+    name: str
+    path: tuple
+    min_value: float
+    max_value: float
+    step: float
+    unit: Optional[str] = None
+
+
+NUMBERS = (
+    VwIdNumberDescription(
+        'Volkswagen ID Target State Of Charge Setting',
+        ('charging_settings', 'target_soc_pct'),
+        50, 100, 10, '%',
+    ),
+    VwIdNumberDescription(
+        'Volkswagen ID Target Temperature Setting',
+        ('climatisation_settings', 'target_temperature_c'),
+        16, 29.5, 0.5, '°C',
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: core.HomeAssistant,
+    config_entry: config_entries.ConfigEntry,
+    async_add_entities,
+):
+    """Set up the setting numbers of every vehicle of the entry."""
+    fleet = hass.data[DOMAIN][config_entry.entry_id]
+    async_add_entities(
+        VwIdNumber(fleet.coordinators[vin], fleet.commanders[vin], vin, description)
+        for vin in fleet.vins
+        for description in NUMBERS
+    )
+
+
+class VwIdNumber(VwIdControlEntity, NumberEntity):
+    """A numeric setting of the vehicle."""
+
+    def __init__(self, coordinator, commander, vin, description: VwIdNumberDescription):
+        """Initialize the number."""
+        super().__init__(coordinator, commander, vin, description.name)
+        self.description = description
+        self.status_sections = (description.path[0],)
+
+    @property
+    def native_value(self) -> Optional[float]:
+        return self.current(*self.description.path)
+
+    @property
+    def native_min_value(self) -> float:
+        return self.description.min_value
+
+    @property
+    def native_max_value(self) -> float:
+        return self.description.max_value
+
+    @property
+    def native_step(self) -> float:
+        return self.description.step
+
+    @property
+    def native_unit_of_measurement(self) -> Optional[str]:
+        return self.description.unit
+
+    async def async_set_native_value(self, value: float) -> None:
+        """Change the setting with the next write."""
+        if self.description.step >= 1:
+            value = int(value)
+        self.commander.async_set(*self.description.path, value)
+        self.async_show_optimistic()
@@ -0,0 +1,66 @@
+"""Profiling of a refresh cycle, see the vwid.profile_refresh service."""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+from typing import List, Optional
+
+from homeassistant import core
+
+from .coordinator import VwIdFleet
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_PROFILE_REFRESH = "profile_refresh"
+ATTR_TOP = "top"
+DEFAULT_TOP = 30
+
+
+def write_profile(profile: cProfile.Profile, path: str, top: int) -> None:
+    """Write the profile and a summary of its top functions."""
+    profile.dump_stats(f"{path}.prof")
+    summary = io.StringIO()
+    stats = pstats.Stats(profile, stream=summary)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    with open(f"{path}.txt", "w") as file:
+        file.write(summary.getvalue())
+
+
+async def async_profile_refresh(
+    hass: core.HomeAssistant,
+    fleets: List[VwIdFleet],
+    vin: Optional[str] = None,
+    top: int = DEFAULT_TOP,
+) -> str:
+    """Refresh the vehicles under cProfile and write the result.
+
+    The profiler sees everything running in the event loop meanwhile, not
+    just the refreshes. Returns the path of the files without extension.
+    """
+    refreshes = [
+        fleet.async_refresh_full(fleet_vin)
+        for fleet in fleets
+        for fleet_vin in fleet.vins
+        if vin is None or fleet_vin == vin
+    ]
+    path = hass.config.path(f"vwid_profile_{int(time.time())}")
+
+    profile = cProfile.Profile()
+    start = time.monotonic()
+    profile.enable()
+    try:
+        await asyncio.gather(*refreshes)
+    finally:
+        profile.disable()
+    _LOGGER.info(
+        "Profiled %d refreshes in %.3f s, writing %s.prof and %s.txt",
+        len(refreshes),
+        time.monotonic() - start,
+        path,
+        path,
+    )
+    await hass.async_add_executor_job(write_profile, profile, path, top)
+    return path
@@ -0,0 +1,48 @@
+"""Select entities changing the settings of a vehicle."""
+from typing import List, Optional
+
+from homeassistant import config_entries, core
+from homeassistant.components.select import SelectEntity
+
+from .const import DOMAIN
+from .entity import VwIdControlEntity
+
+MAX_CHARGE_CURRENT_OPTIONS = ['maximum', 'reduced']
+
+
+async def async_setup_entry(
+    hass: core.HomeAssistant,
+    config_entry: config_entries.ConfigEntry,
+    async_add_entities,
+):
+    """Set up the setting selects of every vehicle of the entry."""
+    fleet = hass.data[DOMAIN][config_entry.entry_id]
+    async_add_entities(
+        VwIdMaxChargeCurrentSelect(fleet.coordinators[vin], fleet.commanders[vin], vin)
+        for vin in fleet.vins
+    )
+
+
+class VwIdMaxChargeCurrentSelect(VwIdControlEntity, SelectEntity):
+    """The maximum AC charging current setting."""
+
+    status_sections = ('charging_settings',)
+
+    def __init__(self, coordinator, commander, vin):
+        """Initialize the select."""
+        super().__init__(
+            coordinator, commander, vin, 'Volkswagen ID Max Charge Current AC Setting'
+        )
+
+    @property
+    def options(self) -> List[str]:
+        return MAX_CHARGE_CURRENT_OPTIONS
+
+    @property
+    def current_option(self) -> Optional[str]:
+        return self.current('charging_settings', 'max_charge_current_ac')
+
+    async def async_select_option(self, option: str) -> None:
+        """Change the setting with the next write."""
+        self.commander.async_set('charging_settings', 'max_charge_current_ac', option)
+        self.async_show_optimistic()
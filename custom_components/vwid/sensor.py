@@ -1,227 +1,332 @@
-from .libvwid import vwid
-import asyncio
 import logging
-import aiohttp
-import voluptuous as vol
+from dataclasses import dataclass
 from datetime import timedelta
-from typing import Any, Callable, Dict, Optional
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
 from homeassistant import config_entries, core
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.entity import Entity
-from homeassistant.components.sensor import (
-    PLATFORM_SCHEMA,
-    ENTITY_ID_FORMAT,
-)
+from homeassistant.core import callback
 from homeassistant.const import (
-    ATTR_NAME,
-    CONF_NAME,
-    CONF_PASSWORD,
     DEVICE_CLASS_BATTERY,
+    DEVICE_CLASS_ENERGY,
+    DEVICE_CLASS_MONETARY,
     DEVICE_CLASS_POWER,
     DEVICE_CLASS_TEMPERATURE,
 )
-from homeassistant.helpers.typing import (
-    ConfigType,
-    DiscoveryInfoType,
-    HomeAssistantType,
-)
-from .const import (
-    DOMAIN,
-    CONF_VIN
+from homeassistant.helpers.entity import Entity, EntityCategory
+from homeassistant.helpers.event import async_track_time_interval
+import homeassistant.util.dt as dt_util
+from .const import DOMAIN
+from .entity import VwIdEntity, path_getter
+from .estimator import charge_finish, estimate_soc
+from .libvwid import vwid
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# Only the API metrics are polled, and reading them is cheap
+SCAN_INTERVAL = timedelta(minutes=1)
+
+# Update interval of the estimated state of charge while charging
+ESTIMATE_INTERVAL = timedelta(minutes=1)
+
+
+def is_true(value) -> bool:
+    """Convert the API's 'true'/'false' strings."""
+    return value == 'true'
+
+
+@dataclass(frozen=True)
+class VwIdSensorDescription:
+    """Describes where a sensor's value is found in the vehicle status.
+
+    path is the (section, field) of the value in model.VehicleStatus.
+    """
+
+    name: str
+    path: Tuple[str, str]
+    unit: Optional[str] = None
+    device_class: Optional[str] = None
+    transform: Optional[Callable[[Any], Any]] = None
+
+
+SENSORS = (
+    VwIdSensorDescription(
+        'Volkswagen ID State Of Charge',
+        ('battery', 'current_soc_pct'),
+        '%', DEVICE_CLASS_BATTERY,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Current Range In KM',
+        ('battery', 'cruising_range_electric_km'),
+        'km',
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Remaining Charging Time',
+        ('charging', 'remaining_charging_time_to_complete_min'),
+        'minutes',
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Charging State',
+        ('charging', 'charging_state'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Charge Mode',
+        ('charging', 'charge_mode'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Charge Power',
+        ('charging', 'charge_power_kw'),
+        'kW', DEVICE_CLASS_POWER,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Charge Rate',
+        ('charging', 'charge_rate_kmph'),
+        'km/h',
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Max Charge Current AC',
+        ('charging_settings', 'max_charge_current_ac'),
+        'km/h',
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Auto Unlock Plug When Charged',
+        ('charging_settings', 'auto_unlock_plug_when_charged'),
+        transform=is_true,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Target State Of Charge',
+        ('charging_settings', 'target_soc_pct'),
+        '%', DEVICE_CLASS_BATTERY,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Plug Connection State',
+        ('plug', 'plug_connection_state'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Plug Lock State',
+        ('plug', 'plug_lock_state'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Remaining Climatisation Time',
+        ('climatisation', 'remaining_climatisation_time_min'),
+        'min',
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Climatisation State',
+        ('climatisation', 'climatisation_state'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Target Temperature F',
+        ('climatisation_settings', 'target_temperature_f'),
+        '°F', DEVICE_CLASS_TEMPERATURE,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Target Temperature K',
+        ('climatisation_settings', 'target_temperature_k'),
+        'K', DEVICE_CLASS_TEMPERATURE,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Target Temperature C',
+        ('climatisation_settings', 'target_temperature_c'),
+        '°C', DEVICE_CLASS_TEMPERATURE,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Climatisation Without External Power',
+        ('climatisation_settings', 'climatisation_without_external_power'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Climatization At Unlock',
+        ('climatisation_settings', 'climatization_at_unlock'),
+        transform=is_true,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Window Heating Enabled',
+        ('climatisation_settings', 'window_heating_enabled'),
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Zone Front Left Enabled',
+        ('climatisation_settings', 'zone_front_left_enabled'),
+        transform=is_true,
+    ),
+    VwIdSensorDescription(
+        'Volkswagen ID Zone Front Right Enabled',
+        ('climatisation_settings', 'zone_front_right_enabled'),
+        transform=is_true,
+    ),
 )
 
-import async_timeout
 
-from homeassistant.exceptions import ConfigEntryAuthFailed
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-    UpdateFailed,
+@dataclass(frozen=True)
+class VwIdMeterDescription:
+    """Describes a sensor showing a total of energy.ChargingMeter."""
+
+    name: str
+    key: str
+    unit: Optional[str] = None
+    device_class: Optional[str] = None
+    session: bool = False
+
+
+METER_SENSORS = (
+    VwIdMeterDescription(
+        'Volkswagen ID Charging Session Energy',
+        'session_energy_kwh', 'kWh', DEVICE_CLASS_ENERGY, session=True,
+    ),
+    VwIdMeterDescription(
+        'Volkswagen ID Charging Session Cost',
+        'session_cost', device_class=DEVICE_CLASS_MONETARY, session=True,
+    ),
+    VwIdMeterDescription(
+        'Volkswagen ID Charged Energy Total',
+        'total_energy_kwh', 'kWh', DEVICE_CLASS_ENERGY,
+    ),
+    VwIdMeterDescription(
+        'Volkswagen ID Charging Cost Total',
+        'total_cost', device_class=DEVICE_CLASS_MONETARY,
+    ),
 )
 
 
-_LOGGER = logging.getLogger(__name__)
+def latency_ms(endpoint: str, percent: int, api: vwid) -> Optional[float]:
+    """Return a latency percentile of an endpoint in milliseconds."""
+    seconds = api.metrics[endpoint].percentile(percent)
+    return None if seconds is None else round(seconds * 1000, 1)
 
-async def async_setup_entry(
-    hass: core.HomeAssistant,
-    config_entry: config_entries.ConfigEntry,
-    async_add_entities,
-):
-    """Setup sensors from a config entry created in the integrations UI."""
-    config = hass.data[DOMAIN][config_entry.entry_id]
-
-    session = async_get_clientsession(hass)
-    api = vwid(session)
-    api.set_credentials(config[CONF_NAME], config[CONF_PASSWORD])
-    api.set_vin(config[CONF_VIN])
-
-
-    async def async_update_data():
-        try:
-            # Note: asyncio.TimeoutError and aiohttp.ClientError are already
-            # handled by the data update coordinator.
-            async with async_timeout.timeout(30):
-                data = await api.get_status()
-                if (data):
-                    _LOGGER.warn(data)
-                    return data
-                else:
-                    _LOGGER.exception("Error retrieving data")
-        except ApiAuthError as err:
-            # Raising ConfigEntryAuthFailed will cancel future updates
-            # and start a config flow with SOURCE_REAUTH (async_step_reauth)
-            raise ConfigEntryAuthFailed from err
-        except ApiError as err:
-            raise UpdateFailed(f"Error communicating with API: {err}")
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name = "VW ID Sensor",
-        update_method = async_update_data,
-        update_interval = timedelta(seconds=30),
-    )
 
-    # Fetch initial data so we have data when entities subscribe
-    await coordinator.async_config_entry_first_refresh()
-# TODO: write classes for all properties, instead of one
-    _LOGGER.warn(coordinator.data['data']['batteryStatus']['currentSOC_pct'])
-    async_add_entities(
-        [
-            VwIdSocSensor(coordinator, api.vin),
-            VwIdCurrentRangeSensor(coordinator, api.vin),
-            VwIdRemainingChargingTimeSensor(coordinator, api.vin),
-            VwIdChargingStateSensor(coordinator, api.vin),
-            VwIdChargeModeSensor(coordinator, api.vin),
-            VwIdChargePowerSensor(coordinator, api.vin),
-            VwIdChargeRateSensor(coordinator, api.vin),
-            VwIdMaxChargeCurrentACSensor(coordinator, api.vin),
-            VwIdAutoUnlockPlugWhenChargedSensor(coordinator, api.vin),
-            VwIdTargetStateOfChargeSensor(coordinator, api.vin),
-            VwIdPlugConnectionStateSensor(coordinator, api.vin),
-            VwIdPlugLockStateSensor(coordinator, api.vin),
-            VwIdRemainingClimatisationTimeSensor(coordinator, api.vin),
-            VwIdRemainingClimatisationStateSensor(coordinator, api.vin),
-
-            VwIdTargetTemperatureFSensor(coordinator, api.vin),
-            VwIdTargetTemperatureKSensor(coordinator, api.vin),
-            VwIdTargetTemperatureCSensor(coordinator, api.vin),
-
-            VwIdClimatisationWithoutExternalPowerSensor(coordinator, api.vin),
-            VwIdClimatizationAtUnlockSensor(coordinator, api.vin),
-            VwIdWindowHeatingSensor(coordinator, api.vin),
-            VwIdZoneFrontLeftEnabledSensor(coordinator, api.vin),
-            VwIdZoneFrontRightEnabledSensor(coordinator, api.vin), 
-            
-        ],
-        True
-    )
+def request_count(endpoint: str, api: vwid) -> int:
+    """Return the number of requests sent to an endpoint."""
+    return api.metrics[endpoint].count
 
-class VwIdWindowHeatingSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Window Heating Enabled'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
 
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
+def connections(endpoint: str, reused: bool, api: vwid) -> int:
+    """Return the connections opened or reused for requests to an endpoint."""
+    metrics = api.metrics[endpoint]
+    return metrics.connections_reused if reused else metrics.connections_created
 
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
 
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
+def failed_requests(api: vwid) -> int:
+    """Return the number of failed requests over all endpoints."""
+    return sum(metrics.failures for metrics in api.metrics.values())
 
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationSettings']['windowHeatingEnabled']
-        #return self._state
 
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+def stat(key: str, api: vwid) -> int:
+    """Return a counter of the API client's statistics."""
+    return api.stats[key]
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
 
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
+@dataclass(frozen=True)
+class VwIdMetricDescription:
+    """Describes a diagnostic sensor reading the API client's metrics."""
 
-        await self.coordinator.async_request_refresh()
+    name: str
+    key: str
+    value: Callable[[vwid], Any]
+    unit: Optional[str] = None
 
-class VwIdSocSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID State Of Charge'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
 
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
+ENDPOINT_NAMES = (
+    ('authorize', 'Authorize'),
+    ('email', 'Email Form'),
+    ('password', 'Password Form'),
+    ('login', 'Login'),
+    ('refresh', 'Token Refresh'),
+    ('vehicles', 'Vehicles'),
+    ('status', 'Status'),
+)
 
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
+METRICS = tuple(
+    description
+    for endpoint, title in ENDPOINT_NAMES
+    for description in (
+        VwIdMetricDescription(
+            f'Volkswagen ID API {title} Latency P50',
+            f'{endpoint}_latency_p50',
+            partial(latency_ms, endpoint, 50),
+            'ms',
+        ),
+        VwIdMetricDescription(
+            f'Volkswagen ID API {title} Latency P95',
+            f'{endpoint}_latency_p95',
+            partial(latency_ms, endpoint, 95),
+            'ms',
+        ),
+        VwIdMetricDescription(
+            f'Volkswagen ID API {title} Requests',
+            f'{endpoint}_requests',
+            partial(request_count, endpoint),
+        ),
+    )
+) + (
+    VwIdMetricDescription(
+        'Volkswagen ID API Status Connections Opened',
+        'status_connections_opened',
+        partial(connections, 'status', False),
+    ),
+    VwIdMetricDescription(
+        'Volkswagen ID API Status Connections Reused',
+        'status_connections_reused',
+        partial(connections, 'status', True),
+    ),
+    VwIdMetricDescription(
+        'Volkswagen ID API Failed Requests', 'failed_requests', failed_requests
+    ),
+    VwIdMetricDescription(
+        'Volkswagen ID API Token Refreshes',
+        'token_refreshes',
+        partial(stat, 'token_refreshes'),
+    ),
+    VwIdMetricDescription(
+        'Volkswagen ID API Reconnects', 'reconnects', partial(stat, 'reconnects')
+    ),
+    VwIdMetricDescription(
+        'Volkswagen ID API Failed Reconnects',
+        'failed_reconnects',
+        partial(stat, 'failed_reconnects'),
+    ),
+)
 
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
 
-    @property
-    def state(self):
-        return self.coordinator.data['data']['batteryStatus']['currentSOC_pct']
-        #return self._state
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_BATTERY
+async def async_setup_entry(
+    hass: core.HomeAssistant,
+    config_entry: config_entries.ConfigEntry,
+    async_add_entities,
+):
+    """Setup sensors from a config entry created in the integrations UI."""
+    fleet = hass.data[DOMAIN][config_entry.entry_id]
 
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+    entities = []
+    for vin, coordinator in fleet.coordinators.items():
+        entities += [
+            VwIdSensor(coordinator, vin, description) for description in SENSORS
+        ]
+        entities += [
+            VwIdMeterSensor(coordinator, vin, fleet.meters[vin], description)
+            for description in METER_SENSORS
+        ]
+        entities.append(VwIdEstimatedSocSensor(coordinator, vin))
 
-    @property
-    def unit_of_measurement(self):
-        return '%'
+    entities += [
+        VwIdMetricSensor(fleet.api, config_entry.entry_id, description)
+        for description in METRICS
+    ]
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
+    # The fleet already fetched the first status of every vehicle, so the
+    # entities are added without an update of their own
+    async_add_entities(entities)
 
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
 
-class VwIdCurrentRangeSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
+class VwIdSensor(VwIdEntity):
+    """Sensor showing one value of the vehicle status."""
+
+    def __init__(self, coordinator, vin, description: VwIdSensorDescription):
         """Pass coordinator to CoordinatorEntity."""
         super().__init__(coordinator)
-        self._name = 'Volkswagen ID Current Range In KM'
+        self.description = description
+        self._name = description.name
+        self._get = path_getter(description.path)
+        self.status_sections = (description.path[0],)
         self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
+        self._entity_id = vin + "_" + self._name
 
     @property
     def should_poll(self) -> bool:
@@ -240,36 +345,46 @@ class VwIdCurrentRangeSensor(CoordinatorEntity):
 
     @property
     def state(self):
-        return self.coordinator.data['data']['batteryStatus']['cruisingRangeElectric_km']
+        value = self._get(self.coordinator.data)
+        if value is not None and self.description.transform is not None:
+            return self.description.transform(value)
+        return value
 
     @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+    def device_class(self):
+        return self.description.device_class
 
     @property
     def unit_of_measurement(self):
-        return 'km'
+        return self.description.unit
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
+    @property
+    def device_state_attributes(self) -> Dict[str, Any]:
+        return self.attrs
 
     async def async_update(self):
         """Update the entity.
         Only used by the generic entity update service.
         """
-        
+
         await self.coordinator.async_request_refresh()
 
-class VwIdRemainingChargingTimeSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
+
+class VwIdMeterSensor(VwIdEntity):
+    """Sensor showing the charged energy or its cost.
+
+    The meter is fed by the fleet with every poll, see
+    coordinator.VwIdFleet, and the sensor shows it with the coordinator's
+    updates.
+    """
+
+    def __init__(self, coordinator, vin, meter, description: VwIdMeterDescription):
         """Pass coordinator to CoordinatorEntity."""
         super().__init__(coordinator)
-        self._name = 'Volkswagen ID Remaining Charging Time'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
+        self.meter = meter
+        self.description = description
+        self.vin = vin
+        self._entity_id = vin + "_" + description.name
 
     @property
     def should_poll(self) -> bool:
@@ -279,7 +394,7 @@ class VwIdRemainingChargingTimeSensor(CoordinatorEntity):
     @property
     def name(self) -> str:
         """Return the name of the entity."""
-        return self._name
+        return self.description.name
 
     @property
     def unique_id(self) -> str:
@@ -288,124 +403,55 @@ class VwIdRemainingChargingTimeSensor(CoordinatorEntity):
 
     @property
     def state(self):
-        return self.coordinator.data['data']['chargingStatus']['remainingChargingTimeToComplete_min']
+        return round(getattr(self.meter, self.description.key), 3)
 
     @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+    def device_class(self):
+        return self.description.device_class
 
     @property
     def unit_of_measurement(self):
-        return 'minutes'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()
-
-class VwIdChargingStateSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Charging State'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['chargingStatus']['chargingState']
+        if self.description.device_class == DEVICE_CLASS_MONETARY:
+            # Set in the general configuration since Home Assistant 2021.11
+            return getattr(self.hass.config, 'currency', None) if self.hass else None
+        return self.description.unit
 
     @property
     def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+        attrs = {'vin': self.vin}
+        if self.description.session:
+            attrs['session_active'] = self.meter.session_active
+            start = self.meter.session_start
+            attrs['session_start'] = (
+                None if start is None else dt_util.utc_from_timestamp(start).isoformat()
+            )
+        return attrs
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
 
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()
+class VwIdEstimatedSocSensor(VwIdEntity):
+    """State of charge, estimated between polls while charging."""
+
+    status_sections = ('battery', 'charging', 'charging_settings')
 
-class VwIdChargeModeSensor(CoordinatorEntity):
     def __init__(self, coordinator, vin):
         """Pass coordinator to CoordinatorEntity."""
         super().__init__(coordinator)
-        self._name = 'Volkswagen ID Charge Mode'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['chargingStatus']['chargeMode']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+        self.vin = vin
+        self._name = 'Volkswagen ID Estimated State Of Charge'
+        self._entity_id = vin + "_" + self._name
 
     async def async_added_to_hass(self):
-        """When entity is added to hass."""
+        """Update the estimate regularly while the car is charging."""
+        await super().async_added_to_hass()
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            async_track_time_interval(self.hass, self._async_tick, ESTIMATE_INTERVAL)
         )
 
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()
-
-class VwIdChargePowerSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Charge Power'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
+    @callback
+    def _async_tick(self, _now) -> None:
+        """Write the estimate, unless it is just the polled value."""
+        if charge_finish(self.coordinator.data) is not None:
+            self._handle_coordinator_update()
 
     @property
     def should_poll(self) -> bool:
@@ -424,731 +470,62 @@ class VwIdChargePowerSensor(CoordinatorEntity):
 
     @property
     def state(self):
-        return self.coordinator.data['data']['chargingStatus']['chargePower_kW']
-        #return self._state
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_POWER
+        return estimate_soc(self.coordinator.data, dt_util.utcnow().timestamp())
 
     @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+    def device_class(self):
+        return DEVICE_CLASS_BATTERY
 
     @property
     def unit_of_measurement(self):
-        return 'kW'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdChargeRateSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Charge Rate'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
+        return '%'
 
-    @property
-    def state(self):
-        return self.coordinator.data['data']['chargingStatus']['chargeRate_kmph']
-        #return self._state
-        
     @property
     def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    @property
-    def unit_of_measurement(self):
-        return 'km/h'
+        finish = charge_finish(self.coordinator.data)
+        return {
+            'vin': self.vin,
+            'charge_finish': (
+                None if finish is None else dt_util.utc_from_timestamp(finish).isoformat()
+            ),
+        }
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
 
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
+class VwIdMetricSensor(Entity):
+    """Diagnostic sensor showing a metric of the entry's API client.
 
-class VwIdMaxChargeCurrentACSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Max Charge Current AC'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
+    Disabled by default. The client may be shared with other entries of the
+    same account, see client.VwIdClientPool.
+    """
 
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
+    def __init__(self, api: vwid, entry_id: str, description: VwIdMetricDescription):
+        """Initialize the sensor."""
+        self.api = api
+        self.description = description
+        self._unique_id = entry_id + "_" + description.key
 
     @property
     def name(self) -> str:
         """Return the name of the entity."""
-        return self._name
+        return self.description.name
 
     @property
     def unique_id(self) -> str:
         """Return the unique ID of the sensor."""
-        return self._entity_id
+        return self._unique_id
 
     @property
     def state(self):
-        return self.coordinator.data['data']['chargingSettings']['maxChargeCurrentAC']
-        #return self._state
-        
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
+        return self.description.value(self.api)
 
     @property
     def unit_of_measurement(self):
-        return 'km/h'
+        return self.description.unit
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdAutoUnlockPlugWhenChargedSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Auto Unlock Plug When Charged'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
+    @property
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
 
     @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
+    def entity_registry_enabled_default(self) -> bool:
         return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self) -> bool:
-        return self.coordinator.data['data']['chargingSettings']['autoUnlockPlugWhenCharged'] == 'true'
-        
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdTargetStateOfChargeSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Target State Of Charge'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['chargingSettings']['targetSOC_pct']
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_BATTERY
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    @property
-    def unit_of_measurement(self):
-        return '%'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdPlugConnectionStateSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Plug Connection State'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['plugStatus']['plugConnectionState']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()
-
-class VwIdPlugLockStateSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Plug Lock State'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['plugStatus']['plugLockState']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()        
-
-class VwIdClimatisationWithoutExternalPowerSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Climatisation Without External Power'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationSettings']['climatisationWithoutExternalPower']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()      
-
-class VwIdClimatizationAtUnlockSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Climatization At Unlock'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self) -> bool:
-        return self.coordinator.data['data']['climatisationSettings']['climatizationAtUnlock'] == 'true'
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()      
-
-class VwIdRemainingClimatisationTimeSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Remaining Climatisation Time'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def unit_of_measurement(self):
-        return 'min'
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationStatus']['remainingClimatisationTime_min']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()      
-
-class VwIdRemainingClimatisationStateSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Climatisation State'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationStatus']['climatisationState']
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()
-
-class VwIdZoneFrontLeftEnabledSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Zone Front Left Enabled'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self) -> bool:
-        return self.coordinator.data['data']['climatisationSettings']['zoneFrontLeftEnabled'] == 'true'
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()    
-
-class VwIdZoneFrontRightEnabledSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Zone Front Right Enabled'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self) -> bool:
-        return self.coordinator.data['data']['climatisationSettings']['zoneFrontRightEnabled'] == 'true'
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        
-        await self.coordinator.async_request_refresh()    
-
-class VwIdTargetTemperatureCSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Target Temperature C'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationSettings']['targetTemperature_C']
-        #return self._state
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_TEMPERATURE
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    @property
-    def unit_of_measurement(self):
-        return '°C'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdTargetTemperatureKSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Target Temperature K'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationSettings']['targetTemperature_K']
-        #return self._state
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_TEMPERATURE
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    @property
-    def unit_of_measurement(self):
-        return 'K'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
-
-class VwIdTargetTemperatureFSensor(CoordinatorEntity):
-    def __init__(self, coordinator, vin):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
-        self._name = 'Volkswagen ID Target Temperature F'
-        self.attrs = {'vin': vin}
-        self._entity_id = vin + "_" + self._name   
-
-    @property
-    def should_poll(self) -> bool:
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return self._entity_id
-
-    @property
-    def state(self):
-        return self.coordinator.data['data']['climatisationSettings']['targetTemperature_F']
-        #return self._state
-        
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_TEMPERATURE
-
-    @property
-    def device_state_attributes(self) -> Dict[str, Any]:
-        return self.attrs
-
-    @property
-    def unit_of_measurement(self):
-        return '°F'
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-    async def async_update(self):
-        """Update the entity.
-        Only used by the generic entity update service.
-        """
-        await self.coordinator.async_request_refresh()
@@ -0,0 +1,89 @@
+"""Switches starting and stopping charging and climatisation."""
+from dataclasses import dataclass
+
+from homeassistant import config_entries, core
+from homeassistant.components.switch import SwitchEntity
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DOMAIN
+from .entity import VwIdControlEntity
+
+
+@dataclass(frozen=True)
+class VwIdSwitchDescription:
+    """Describes the commands of a switch and the state confirming them."""
+
+    name: str
+    path: tuple
+    on_states: tuple
+    off_state: str
+    turn_on: str
+    turn_off: str
+
+
+SWITCHES = (
+    VwIdSwitchDescription(
+        'Volkswagen ID Charging',
+        ('charging', 'charging_state'),
+        ('charging',), 'readyForCharging',
+        'start_charging', 'stop_charging',
+    ),
+    VwIdSwitchDescription(
+        'Volkswagen ID Climatisation',
+        ('climatisation', 'climatisation_state'),
+        ('heating', 'cooling', 'ventilation'), 'off',
+        'start_climatisation', 'stop_climatisation',
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: core.HomeAssistant,
+    config_entry: config_entries.ConfigEntry,
+    async_add_entities,
+):
+    """Set up the switches of every vehicle of the entry."""
+    fleet = hass.data[DOMAIN][config_entry.entry_id]
+    async_add_entities(
+        VwIdSwitch(fleet.coordinators[vin], fleet.commanders[vin], vin, description)
+        for vin in fleet.vins
+        for description in SWITCHES
+    )
+
+
+class VwIdSwitch(VwIdControlEntity, SwitchEntity):
+    """Starts and stops charging or climatisation."""
+
+    def __init__(self, coordinator, commander, vin, description: VwIdSwitchDescription):
+        """Initialize the switch."""
+        super().__init__(coordinator, commander, vin, description.name)
+        self.description = description
+        self.status_sections = (description.path[0],)
+
+    @property
+    def is_on(self) -> bool:
+        return self.current(*self.description.path) in self.description.on_states
+
+    async def async_turn_on(self, **kwargs) -> None:
+        """Start charging or climatisation."""
+        await self._async_command(
+            self.description.turn_on, self.description.on_states[0]
+        )
+
+    async def async_turn_off(self, **kwargs) -> None:
+        """Stop charging or climatisation."""
+        await self._async_command(
+            self.description.turn_off, self.description.off_state
+        )
+
+    async def _async_command(self, command: str, state: str) -> None:
+        """Send a command, showing its result until the car confirms it."""
+        # Shown before the command is sent, which takes a while
+        self.commander.async_set_optimistic(*self.description.path, state)
+        self.async_show_optimistic()
+        try:
+            await self.commander.async_command(command, *self.description.path, state)
+        except HomeAssistantError:
+            # Show the polled state again
+            self._handle_coordinator_update()
+            raise
@@ -0,0 +1,240 @@
+"""Sources of the status updates of a fleet.
+
+The vehicles are always polled, see VwIdPollingTransport. A push transport
+feeds status documents bridged from another source into the coordinators
+as they arrive, e.g. from a local MQTT broker or a webhook; while they keep
+arriving, the vehicles are only polled as a safety net.
+"""
+from abc import ABC, abstractmethod
+import json
+import logging
+import math
+from typing import Any, Dict, Iterable, Optional
+
+from aiohttp import web
+
+from homeassistant.components import mqtt, webhook
+from homeassistant.const import CONF_WEBHOOK_ID
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    CONF_MQTT_TOPIC,
+    CONF_PUSH_TRANSPORT,
+    DEFAULT_MQTT_TOPIC,
+    DOMAIN,
+    PUSH_MQTT,
+    PUSH_WEBHOOK,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class VwIdTransport(ABC):
+    """Source of the status updates of the vehicles of a fleet."""
+
+    def __init__(self, fleet):
+        """Initialize the transport of a coordinator.VwIdFleet."""
+        self.fleet = fleet
+        self.hass = fleet.hass
+
+    @abstractmethod
+    async def async_start(self) -> None:
+        """Start delivering status updates."""
+
+    @callback
+    @abstractmethod
+    def async_stop(self) -> None:
+        """Stop delivering status updates."""
+
+
+class VwIdPollingTransport(VwIdTransport):
+    """Polls the vehicles of a fleet on one schedule.
+
+    The first polls are spread evenly over the polling interval instead of
+    firing all at once, then every vehicle is polled at the interval of
+    VwIdFleet.async_interval.
+    """
+
+    def __init__(self, fleet):
+        """Initialize the transport."""
+        super().__init__(fleet)
+        self._due: Dict[str, float] = {}
+        self._unsub_refresh = None
+        self._stopped = False
+
+    async def async_start(self, due_now: Iterable[str] = ()) -> None:
+        """Schedule the vehicles at even offsets within their interval.
+
+        The vehicles in due_now are polled right away instead.
+        """
+        now = self.hass.loop.time()
+        vins = self.fleet.vins
+        for index, vin in enumerate(vins):
+            offset = (index + 1) / len(vins)
+            self._due[vin] = now + self.fleet.async_interval(vin) * offset
+        for vin in due_now:
+            self._due[vin] = now
+        self._async_schedule_next()
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop polling."""
+        self._stopped = True
+        if self._unsub_refresh:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+
+    @callback
+    def _async_schedule_next(self) -> None:
+        """Wake up when the next vehicle is due."""
+        if self._stopped:
+            return
+        if self._unsub_refresh:
+            self._unsub_refresh()
+        delay = max(min(self._due.values()) - self.hass.loop.time(), 0)
+        self._unsub_refresh = async_call_later(
+            self.hass, delay, self._async_handle_due
+        )
+
+    @callback
+    def _async_handle_due(self, _now) -> None:
+        """Refresh the vehicles that are due."""
+        self._unsub_refresh = None
+        now = self.hass.loop.time()
+        for vin, due in self._due.items():
+            if due <= now:
+                # Rescheduled once the new status is known
+                self._due[vin] = math.inf
+                self.hass.async_create_task(self.async_refresh(vin))
+        if min(self._due.values()) < math.inf:
+            self._async_schedule_next()
+
+    async def async_refresh(self, vin: str) -> None:
+        """Poll a vehicle and schedule its next poll from the new status."""
+        await self.fleet.async_poll(vin)
+        interval = self.fleet.async_interval(vin)
+        _LOGGER.debug("Next poll of %s in %.0f s", vin, interval)
+        # Requests are paused after repeated server errors, so do not poll
+        # before they are allowed again
+        self._due[vin] = max(
+            self.hass.loop.time() + interval, self.fleet.api.circuit_open_until
+        )
+        self._async_schedule_next()
+
+    @callback
+    def async_reschedule(self, vin: str) -> None:
+        """Schedule the next poll of a vehicle from a status pushed just now."""
+        if self._due.get(vin, math.inf) == math.inf:
+            # Not started yet, or a poll is running and reschedules it
+            return
+        self._due[vin] = self.hass.loop.time() + self.fleet.async_interval(vin)
+        self._async_schedule_next()
+
+
+class VwIdPushTransport(VwIdTransport):
+    """Feeds pushed status documents into the coordinators.
+
+    A document has the format of the status API, and may hold only some of
+    the sections; the others keep their last value.
+    """
+
+    @callback
+    def async_feed(self, vin: Optional[str], payload: Any) -> bool:
+        """Feed a pushed status document, returning whether it was valid."""
+        if not isinstance(payload, dict) or not isinstance(payload.get("data"), dict):
+            _LOGGER.warning("Ignoring pushed status of %s without data", vin)
+            return False
+        if vin not in self.fleet.coordinators:
+            _LOGGER.warning("Ignoring pushed status of unknown vehicle %s", vin)
+            return False
+        self.fleet.async_push(vin, payload)
+        return True
+
+
+class VwIdMqttTransport(VwIdPushTransport):
+    """Receives the status documents from MQTT, on <topic>/<vin>/status."""
+
+    def __init__(self, fleet, topic: str):
+        """Initialize the transport."""
+        super().__init__(fleet)
+        self.topic = topic
+        self._unsub = None
+
+    async def async_start(self) -> None:
+        """Subscribe to the status topics of all vehicles."""
+        self._unsub = await mqtt.async_subscribe(
+            self.hass, f"{self.topic}/+/status", self._async_handle_message
+        )
+
+    @callback
+    def async_stop(self) -> None:
+        """Unsubscribe."""
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_handle_message(self, msg) -> None:
+        """Feed a status document received on a topic."""
+        vin = msg.topic.split("/")[-2]
+        try:
+            payload = json.loads(msg.payload)
+        except ValueError:
+            _LOGGER.warning("Ignoring invalid JSON on %s", msg.topic)
+            return
+        self.async_feed(vin, payload)
+
+
+class VwIdWebhookTransport(VwIdPushTransport):
+    """Receives the status documents posted to a webhook.
+
+    The document names its vehicle in "vin", which may be left out when
+    the config entry has a single vehicle.
+    """
+
+    def __init__(self, fleet, webhook_id: str):
+        """Initialize the transport."""
+        super().__init__(fleet)
+        self.webhook_id = webhook_id
+
+    async def async_start(self) -> None:
+        """Register the webhook."""
+        webhook.async_register(
+            self.hass,
+            DOMAIN,
+            self.fleet.entry.title,
+            self.webhook_id,
+            self._async_handle_webhook,
+        )
+
+    @callback
+    def async_stop(self) -> None:
+        """Unregister the webhook."""
+        webhook.async_unregister(self.hass, self.webhook_id)
+
+    async def _async_handle_webhook(self, hass, webhook_id, request):
+        """Feed a posted status document."""
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        vins = self.fleet.vins
+        vin = payload.get("vin") if isinstance(payload, dict) else None
+        if vin is None and len(vins) == 1:
+            vin = vins[0]
+        if not self.async_feed(vin, payload):
+            return web.Response(status=400)
+        return web.Response(status=200)
+
+
+def create_push_transport(fleet) -> Optional[VwIdPushTransport]:
+    """Return the push transport set in the options of a fleet, if any."""
+    options = fleet.entry.options
+    push = options.get(CONF_PUSH_TRANSPORT)
+    if push == PUSH_MQTT:
+        topic = options.get(CONF_MQTT_TOPIC, DEFAULT_MQTT_TOPIC)
+        return VwIdMqttTransport(fleet, topic)
+    if push == PUSH_WEBHOOK and options.get(CONF_WEBHOOK_ID):
+        return VwIdWebhookTransport(fleet, options[CONF_WEBHOOK_ID])
+    return None
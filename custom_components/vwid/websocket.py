@@ -0,0 +1,49 @@
+"""Websocket commands of the integration."""
+import voluptuous as vol
+
+from homeassistant import core
+from homeassistant.components import websocket_api
+from homeassistant.core import callback
+
+from .const import CONF_VIN, DOMAIN
+from .coordinator import VwIdFleet
+
+
+@callback
+def async_setup(hass: core.HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_history)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "vwid/history",
+        vol.Required(CONF_VIN): str,
+        vol.Optional("start"): vol.Coerce(float),
+        vol.Optional("end"): vol.Coerce(float),
+        vol.Optional("points"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    }
+)
+@callback
+def websocket_history(hass, connection, msg):
+    """Return the recent samples of a vehicle, optionally downsampled.
+
+    start and end are unix timestamps; the result has a list per series
+    with the sample times in "time".
+    """
+    vin = msg[CONF_VIN]
+    for fleet in hass.data.get(DOMAIN, {}).values():
+        if isinstance(fleet, VwIdFleet) and vin in fleet.history:
+            history = fleet.history[vin]
+            break
+    else:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, f"Unknown vehicle {vin}"
+        )
+        return
+
+    if "points" in msg:
+        samples = history.downsample(msg["points"], msg.get("start"), msg.get("end"))
+    else:
+        samples = history.window(msg.get("start"), msg.get("end"))
+    connection.send_result(msg["id"], samples)
@@ -0,0 +1,220 @@
+"""Export the status of vehicles as JSON Lines, without Home Assistant.
+
+Logs in once and polls the vehicles concurrently, writing one record per
+vehicle and poll to stdout or to a rotating file. Run from the repository
+root:
+
+    python -m script.exporter --username USER --once
+    python -m script.exporter --username USER --interval 300 --output fleet.jsonl
+
+The password is read from VWID_PASSWORD unless given with --password.
+Without --vin, every vehicle of the account is polled.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import importlib.util
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+LIBVWID_PATH = Path(__file__).resolve().parents[1] / "custom_components/vwid/libvwid.py"
+
+
+def load_libvwid():
+    """Return the libvwid module.
+
+    It is loaded from its file, as importing it from its package would
+    load the integration and Home Assistant.
+    """
+    spec = importlib.util.spec_from_file_location("libvwid", LIBVWID_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+libvwid = load_libvwid()
+ApiError = libvwid.ApiError
+vwid = libvwid.vwid
+
+# Failures of a request, recorded instead of ending the export
+REQUEST_ERRORS = (ApiError, aiohttp.ClientError, asyncio.TimeoutError)
+
+# Status requests in flight at the same time
+DEFAULT_WORKERS = 4
+
+# Seconds from the start of one poll of all vehicles to the next
+DEFAULT_INTERVAL = 600
+
+# Size at which the output file is rotated, and the rotated files kept
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+
+class JsonLinesWriter:
+    """Writes records as JSON Lines to stdout, or to a rotating file."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUP_COUNT,
+    ):
+        """Initialize the writer."""
+        self._handler = None
+        if path is not None:
+            self._handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Write a record as one line."""
+        line = json.dumps(record, separators=(",", ":"))
+        if self._handler is None:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+        else:
+            # Rotates the file first when the line would not fit
+            self._handler.emit(logging.makeLogRecord({"msg": line}))
+
+    def close(self) -> None:
+        """Close the output file."""
+        if self._handler is not None:
+            self._handler.close()
+
+
+async def poll_vehicle(
+    api: vwid, vin: str, semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    """Return the record of one status poll of a vehicle."""
+    async with semaphore:
+        record: Dict[str, Any] = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "vin": vin,
+        }
+        try:
+            status = await api.get_status(vin)
+        except REQUEST_ERRORS as err:
+            record["error"] = str(err) or type(err).__name__
+        else:
+            record["data"] = status.get("data") if status else None
+        return record
+
+
+async def export(
+    api: vwid,
+    vins: List[str],
+    writer: JsonLinesWriter,
+    workers: int = DEFAULT_WORKERS,
+    interval: float = DEFAULT_INTERVAL,
+    rounds: Optional[int] = None,
+) -> None:
+    """Poll all vehicles every interval, rounds times or until cancelled.
+
+    At most workers status requests are in flight; records are written in
+    the order the polls finish.
+    """
+    semaphore = asyncio.Semaphore(workers)
+    done = 0
+    while rounds is None or done < rounds:
+        started = time.monotonic()
+        for poll in asyncio.as_completed(
+            [poll_vehicle(api, vin, semaphore) for vin in vins]
+        ):
+            writer.write(await poll)
+        done += 1
+        if rounds is None or done < rounds:
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Log in, export the vehicles and return the exit status."""
+    api = vwid()
+    api.set_credentials(args.username, args.password)
+    writer = JsonLinesWriter(args.output, args.max_bytes, args.backup_count)
+    try:
+        if not await api.reconnect():
+            _LOGGER.error("Login failed")
+            return 1
+        vins = args.vin
+        if not vins:
+            vins = [vehicle["vin"] for vehicle in await api.get_vehicles()]
+        await export(
+            api,
+            vins,
+            writer,
+            args.workers,
+            args.interval,
+            1 if args.once else None,
+        )
+        return 0
+    except REQUEST_ERRORS as err:
+        _LOGGER.error("Error communicating with API: %s", err)
+        return 1
+    finally:
+        api.close()
+        await api.close_session()
+        writer.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Return the parsed command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--username", required=True)
+    parser.add_argument(
+        "--password",
+        default=os.environ.get("VWID_PASSWORD"),
+        help="defaults to the VWID_PASSWORD environment variable",
+    )
+    parser.add_argument(
+        "--vin",
+        action="append",
+        help="vehicle to poll, may be repeated; defaults to all vehicles",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="seconds between polls in continuous mode",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="poll every vehicle once and exit"
+    )
+    parser.add_argument("--output", help="file to write to instead of stdout")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument("--backup-count", type=int, default=DEFAULT_BACKUP_COUNT)
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.password:
+        parser.error("no password given, set --password or VWID_PASSWORD")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the exporter until done or interrupted."""
+    args = parse_args(argv)
+    # Logs go to stderr, so they never mix with the records on stdout
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr
+    )
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Benchmark the login form extraction against an lxml DOM parse.
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_login_form
+"""
+import pathlib
+import timeit
+import tracemalloc
+
+from custom_components.vwid.libvwid import parse_login_form
+
+FIXTURES = pathlib.Path(__file__).parent.parent / "fixtures"
+PAGES = ("login_email.html", "login_password.html")
+ROUNDS = 200
+
+
+def lxml_form(text):
+    """Extract the form the way vwid did before, with a full DOM."""
+    import lxml.html
+
+    page = lxml.html.fromstring(text)
+    elements = page.xpath('//form//input[@type="hidden"]')
+    form = {x.attrib["name"]: x.attrib["value"] for x in elements}
+    return (form, page.forms[0].action)
+
+
+def peak_allocation(func, text):
+    """Return the peak traced memory of one call in bytes.
+
+    Only Python allocations are traced, memory libxml2 allocates for lxml's
+    DOM does not show up here.
+    """
+    tracemalloc.start()
+    func(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    """Print time and peak allocation per page for both extractors."""
+    try:
+        import lxml.html  # noqa: F401
+
+        extractors = {"parse_login_form": parse_login_form, "lxml": lxml_form}
+    except ImportError:
+        extractors = {"parse_login_form": parse_login_form}
+
+    for name in PAGES:
+        text = (FIXTURES / name).read_bytes()
+        print(f"{name} ({len(text)} bytes)")
+        for label, func in extractors.items():
+            seconds = timeit.timeit(lambda: func(text), number=ROUNDS) / ROUNDS
+            peak = peak_allocation(func, text)
+            print(f"  {label:18} {seconds * 1e6:9.1f} us  {peak / 1024:8.1f} KiB peak")
+
+
+if __name__ == "__main__":
+    main()
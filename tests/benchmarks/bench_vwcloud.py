@@ -0,0 +1,93 @@
+"""Benchmark vwid against the local stand-in for the We Connect ID cloud.
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_vwcloud --vins 20 --latency 0.05
+
+The server runs in the same process, so the CPU figures include its share.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiohttp.test_utils import TestServer
+
+from custom_components.vwid.libvwid import vwid
+
+from ..vwcloud import VwCloud
+
+
+def summary(samples):
+    """Return the median and 95th percentile of samples in milliseconds."""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+
+
+async def timed(coro):
+    """Return the wall time of awaiting a coroutine."""
+    start = time.perf_counter()
+    assert await coro
+    return time.perf_counter() - start
+
+
+async def run(args):
+    """Run all benchmarks and print the results."""
+    vins = [f"WVWZZZE1ZMP{n:06d}" for n in range(args.vins)]
+    cloud = VwCloud(vins=vins)
+    server = TestServer(cloud.app)
+    await server.start_server()
+    cloud.url = str(server.make_url("")).rstrip("/")
+
+    api = vwid()
+    try:
+        try:
+            api.set_base_urls(cloud.url, cloud.url, cloud.url)
+            api.set_credentials(cloud.username, cloud.password)
+
+            logins = [await timed(api.reconnect()) for _ in range(args.rounds)]
+            print(f"login            {summary(logins)}")
+
+            refreshes = [await timed(api.refresh_tokens()) for _ in range(args.rounds)]
+            print(f"token refresh    {summary(refreshes)}")
+
+            cloud.latency = args.latency
+            cycles = []
+            cpu = []
+            for _ in range(args.rounds):
+                cpu_start = time.process_time()
+                cycles.append(
+                    await timed(asyncio.gather(*(api.get_status(vin) for vin in vins)))
+                )
+                cpu.append(time.process_time() - cpu_start)
+            polls = args.vins * args.rounds
+            print(f"status cycle     {summary(cycles)}  ({args.vins} VINs)")
+            print(f"status polls     {polls / sum(cycles):7.1f} /s")
+            print(f"CPU per cycle    {summary(cpu)}")
+            print(f"requests         {cloud.requests}")
+            status = api.metrics["status"]
+            print(
+                f"connections      {status.connections_created} opened, "
+                f"{status.connections_reused} reused for status polls"
+            )
+        finally:
+            api.close()
+            await api.close_session()
+    finally:
+        await server.close()
+
+
+def main():
+    """Parse the arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark vwid against a local stand-in server.")
+    parser.add_argument("--vins", type=int, default=10, help="vehicles polled at once")
+    parser.add_argument("--rounds", type=int, default=20, help="repetitions")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="status latency in seconds"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Fixtures for the tests of the integration."""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Enable the integration in every test."""
+    yield
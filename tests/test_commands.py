@@ -0,0 +1,229 @@
+"""Test the commands and setting changes sent to a vehicle."""
+from datetime import timedelta
+import logging
+from unittest.mock import patch
+
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.util.dt as dt_util
+
+from custom_components.vwid.coordinator import VwIdCoordinator
+from custom_components.vwid.commands import (
+    OPTIMISTIC_TIMEOUT,
+    WRITE_DELAY,
+    VwIdCommander,
+)
+from custom_components.vwid.libvwid import ApiError
+from custom_components.vwid.model import parse_status
+from custom_components.vwid.number import NUMBERS, VwIdNumber
+from custom_components.vwid.switch import SWITCHES, VwIdSwitch
+
+STATUS = parse_status(
+    {
+        "data": {
+            "chargingStatus": {"chargingState": "readyForCharging"},
+            "chargingSettings": {
+                "maxChargeCurrentAC": "maximum",
+                "autoUnlockPlugWhenCharged": "off",
+                "targetSOC_pct": 80,
+            },
+        }
+    }
+)
+
+
+class FakeApi:
+    """API client recording the writes."""
+
+    def __init__(self):
+        """Initialize the client."""
+        self.writes = []
+        self.error = None
+
+    async def set_settings(self, vin, section, settings):
+        """Record a settings write."""
+        if self.error:
+            raise self.error
+        self.writes.append((vin, section, settings))
+
+    async def start_charging(self, vin=None):
+        """Record a command."""
+        if self.error:
+            raise self.error
+        self.writes.append((vin, "start_charging"))
+
+
+class FakeCoordinator:
+    """Coordinator holding a fixed status."""
+
+    data = STATUS
+
+
+class FakeFleet:
+    """Fleet of one vehicle counting the full refreshes."""
+
+    def __init__(self):
+        """Initialize the fleet."""
+        self.api = FakeApi()
+        self.coordinators = {"VIN": FakeCoordinator()}
+        self.refreshes = 0
+
+    async def async_refresh_full(self, vin):
+        """Count a refresh."""
+        self.refreshes += 1
+
+
+async def test_changes_are_coalesced(hass):
+    """Test changes made in a row are sent with one write."""
+    fleet = FakeFleet()
+    commander = VwIdCommander(hass, fleet, "VIN")
+
+    commander.async_set("charging_settings", "target_soc_pct", 90)
+    commander.async_set("charging_settings", "target_soc_pct", 100)
+    commander.async_set("charging_settings", "max_charge_current_ac", "reduced")
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=WRITE_DELAY - 1))
+    await hass.async_block_till_done()
+    assert fleet.api.writes == []
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=WRITE_DELAY + 1))
+    await hass.async_block_till_done()
+    assert fleet.api.writes == [
+        (
+            "VIN",
+            "charging",
+            {
+                "maxChargeCurrentAC": "reduced",
+                "autoUnlockPlugWhenCharged": "off",
+                "targetSOC_pct": 100,
+            },
+        )
+    ]
+    assert commander.writes == 1
+    assert fleet.refreshes == 1
+
+
+async def test_optimistic_value(hass, monkeypatch):
+    """Test the value set is shown until confirmed or expired."""
+    commander = VwIdCommander(hass, FakeFleet(), "VIN")
+    commander.async_set("charging_settings", "target_soc_pct", 90)
+
+    assert commander.optimistic("charging_settings", "target_soc_pct", 80) == 90
+    # The car confirmed it
+    assert commander.optimistic("charging_settings", "target_soc_pct", 90) == 90
+    assert commander.optimistic("charging_settings", "target_soc_pct", 80) == 80
+
+    commander.async_set("charging_settings", "target_soc_pct", 100)
+    now = hass.loop.time()
+    monkeypatch.setattr(hass.loop, "time", lambda: now + OPTIMISTIC_TIMEOUT)
+    assert commander.optimistic("charging_settings", "target_soc_pct", 80) == 80
+    commander.async_shutdown()
+
+
+async def test_failed_write_drops_optimistic_value(hass):
+    """Test the polled value is shown again when the write failed."""
+    fleet = FakeFleet()
+    fleet.api.error = ApiError("rejected")
+    commander = VwIdCommander(hass, fleet, "VIN")
+    commander.async_set("charging_settings", "target_soc_pct", 90)
+
+    await commander.async_write()
+
+    assert commander.optimistic("charging_settings", "target_soc_pct", 80) == 80
+
+
+async def test_command(hass):
+    """Test a command shows its result and refreshes the status."""
+    fleet = FakeFleet()
+    commander = VwIdCommander(hass, fleet, "VIN")
+
+    await commander.async_command(
+        "start_charging", "charging", "charging_state", "charging"
+    )
+    await hass.async_block_till_done()
+
+    assert fleet.api.writes == [("VIN", "start_charging")]
+    assert fleet.refreshes == 1
+    assert commander.optimistic("charging", "charging_state", "readyForCharging") == (
+        "charging"
+    )
+
+    fleet.api.error = ApiError("rejected")
+    with pytest.raises(HomeAssistantError):
+        await commander.async_command(
+            "start_charging", "charging", "charging_state", "charging"
+        )
+    assert commander.optimistic("charging", "charging_state", "readyForCharging") == (
+        "readyForCharging"
+    )
+
+
+def make_switch(hass, fleet):
+    """Return the charging switch of the vehicle of a fleet."""
+    coordinator = VwIdCoordinator(hass, logging.getLogger(__name__), name="test")
+    coordinator.data = STATUS
+    fleet.coordinators["VIN"] = coordinator
+    switch = VwIdSwitch(
+        coordinator, VwIdCommander(hass, fleet, "VIN"), "VIN", SWITCHES[0]
+    )
+    switch.hass = hass
+    switch._written = switch._state_snapshot()
+    return switch
+
+
+async def test_switch(hass):
+    """Test a switch writes its new state before the command is sent."""
+    fleet = FakeFleet()
+    switch = make_switch(hass, fleet)
+    written = []
+
+    with patch.object(
+        switch, "async_write_ha_state", side_effect=lambda: written.append(switch.is_on)
+    ):
+        await switch.async_turn_on()
+
+    assert written == [True]
+    assert fleet.api.writes == [("VIN", "start_charging")]
+    await hass.async_block_till_done()
+    assert fleet.refreshes == 1
+    switch._unsub_expire()
+
+
+async def test_failed_switch_command(hass):
+    """Test a switch shows the polled state again when the command failed."""
+    fleet = FakeFleet()
+    fleet.api.error = ApiError("rejected")
+    switch = make_switch(hass, fleet)
+    written = []
+
+    with patch.object(
+        switch, "async_write_ha_state", side_effect=lambda: written.append(switch.is_on)
+    ), pytest.raises(HomeAssistantError):
+        await switch.async_turn_on()
+
+    assert written == [True, False]
+    assert fleet.refreshes == 0
+    switch._unsub_expire()
+
+
+async def test_number(hass):
+    """Test a number shows and sends its new setting."""
+    fleet = FakeFleet()
+    coordinator = VwIdCoordinator(hass, logging.getLogger(__name__), name="test")
+    coordinator.data = STATUS
+    fleet.coordinators["VIN"] = coordinator
+    commander = VwIdCommander(hass, fleet, "VIN")
+    number = VwIdNumber(coordinator, commander, "VIN", NUMBERS[0])
+    number.hass = hass
+    number._written = number._state_snapshot()
+    assert number.state == 80
+    assert number.max_value == 100
+
+    with patch.object(number, "async_write_ha_state") as write:
+        await number.async_set_native_value(90.0)
+    assert write.called
+    assert number.state == 90
+    assert commander._pending == {"charging_settings": {"targetSOC_pct": 90}}
+    number._unsub_expire()
+    commander.async_shutdown()
@@ -0,0 +1,323 @@
+"""Test the polling of the vehicles of a config entry."""
+import asyncio
+import logging
+from unittest.mock import Mock, patch
+
+import aiohttp
+import pytest
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.exceptions import ConfigEntryNotReady
+
+from custom_components.vwid.const import (
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_SLOW_INTERVAL,
+    DOMAIN,
+    STORAGE_KEY_STATUS,
+    STORAGE_VERSION,
+)
+from custom_components.vwid.coordinator import (
+    MAX_PARALLEL_REQUESTS,
+    VwIdCoordinator,
+    VwIdFleet,
+    polling_interval,
+)
+from custom_components.vwid.estimator import charge_finish
+from custom_components.vwid.libvwid import UNCHANGED, ApiError
+from custom_components.vwid.model import parse_status
+
+
+def save_status(hass_storage, entry, socs):
+    """Store a status with the state of charge of each vehicle of an entry."""
+    key = STORAGE_KEY_STATUS.format(entry.entry_id)
+    hass_storage[key] = {
+        "version": STORAGE_VERSION,
+        "key": key,
+        "data": {
+            "vins": list(socs),
+            "status": {
+                vin: {"data": {"batteryStatus": {"currentSOC_pct": soc}}}
+                for vin, soc in socs.items()
+            },
+        },
+    }
+
+
+class FakeApi:
+    """API client with an account of several vehicles."""
+
+    def __init__(self, vins):
+        """Initialize the client."""
+        self.vins = vins
+        self.tokens = None
+        self.stats = {}
+        self.circuit_open_until = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sections = []
+
+    async def get_vehicles(self):
+        """Return the vehicles of the account."""
+        return [{"vin": vin} for vin in self.vins]
+
+    async def get_status(self, vin, allow_unchanged=False, sections=None, caller=None):
+        """Return a status after a short delay."""
+        self.sections.append(sections)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return {"data": {"batteryStatus": {"currentSOC_pct": int(vin[3:])}}}
+
+
+async def test_fleet_mode(hass):
+    """Test all vehicles are polled with bounded concurrency and staggered."""
+    vins = [f"VIN{index}" for index in range(10)]
+    api = FakeApi(vins)
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    fleet = VwIdFleet(hass, entry, api)
+
+    await fleet.async_setup()
+
+    assert fleet.vins == vins
+    assert fleet.coordinators["VIN3"].data.battery.current_soc_pct == 3
+    assert fleet.history["VIN3"].window()["soc_pct"] == [3.0]
+    assert api.max_in_flight == MAX_PARALLEL_REQUESTS
+    due = sorted(fleet.polling._due.values())
+    # Nothing is known about the cars, so they are polled as parked
+    slot = DEFAULT_SLOW_INTERVAL / len(vins)
+    assert all(abs(b - a - slot) < 0.1 for a, b in zip(due, due[1:]))
+    fleet.async_shutdown()
+
+
+async def test_unchanged_status_skips_listeners(hass):
+    """Test an unchanged status neither replaces the data nor notifies."""
+    responses = [parse_status({"data": {}}), UNCHANGED, parse_status({"data": {}})]
+
+    async def update():
+        return responses.pop(0)
+
+    coordinator = VwIdCoordinator(
+        hass, logging.getLogger(__name__), name="test", update_method=update
+    )
+    listener = Mock()
+    coordinator.async_add_listener(listener)
+
+    await coordinator.async_refresh()
+    data = coordinator.data
+    assert listener.call_count == 1
+
+    await coordinator.async_refresh()
+    assert coordinator.data is data
+    assert coordinator.skipped_refreshes == 1
+    assert listener.call_count == 1
+
+    await coordinator.async_refresh()
+    assert coordinator.data is not data
+    assert listener.call_count == 2
+
+
+async def test_fetched_sections(hass):
+    """Test only the sections of the fleet and the entities are fetched."""
+    api = FakeApi(["VIN1"])
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    fleet = VwIdFleet(hass, entry, api)
+    await fleet.async_setup()
+    fleet.async_shutdown()
+    coordinator = fleet.coordinators["VIN1"]
+    # The first status is complete
+    assert api.sections == [None]
+
+    remove = coordinator.async_add_sections(["battery", "charging_settings"])
+    coordinator.async_add_sections(["charging_settings"])
+    await coordinator.async_refresh()
+    assert api.sections[-1] == [
+        "batteryStatus",
+        "chargingSettings",
+        "chargingStatus",
+        "climatisationStatus",
+        "plugStatus",
+    ]
+
+    remove()
+    await coordinator.async_refresh()
+    assert "chargingSettings" in api.sections[-1]
+    coordinator.entity_sections.subtract(["charging_settings"])
+    await coordinator.async_refresh()
+    assert "chargingSettings" not in api.sections[-1]
+
+
+def test_polling_interval():
+    """Test the polling interval follows the state of the car."""
+
+    def status(charging="readyForCharging", climatisation="off", plug="disconnected"):
+        return parse_status(
+            {
+                "data": {
+                    "chargingStatus": {"chargingState": charging},
+                    "climatisationStatus": {"climatisationState": climatisation},
+                    "plugStatus": {"plugConnectionState": plug},
+                }
+            }
+        )
+
+    fast, slow = DEFAULT_FAST_INTERVAL, DEFAULT_SLOW_INTERVAL
+    assert polling_interval(status(charging="charging"), fast, slow) == fast
+    assert polling_interval(status(climatisation="heating"), fast, slow) == fast
+    assert polling_interval(status(plug="connected"), fast, slow) == slow / 4
+    assert polling_interval(status(), fast, slow) == slow
+    assert polling_interval(None, fast, slow) == slow
+    assert polling_interval(parse_status({"data": {}}), fast, slow) == slow
+    assert polling_interval(status(plug="connected"), 200, 300) == 200
+
+
+def test_predicted_polling_interval():
+    """Test a charging car is polled when charging is expected to finish."""
+    charging = parse_status(
+        {
+            "data": {
+                "chargingStatus": {
+                    "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                    "chargingState": "charging",
+                    "remainingChargingTimeToComplete_min": 2,
+                }
+            }
+        }
+    )
+    captured = charge_finish(charging) - 120
+    fast, slow = DEFAULT_FAST_INTERVAL, DEFAULT_SLOW_INTERVAL
+    assert polling_interval(charging, fast, slow, captured) == 120
+    assert polling_interval(charging, fast, slow, captured + 100) == fast
+    assert polling_interval(charging, fast, 240, captured) == 60
+
+
+async def test_saved_status_at_startup(hass, hass_storage):
+    """Test a saved status is shown right away and refreshed in the background."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    save_status(hass_storage, entry, {"VIN1": 50})
+    api = FakeApi(["VIN1"])
+    release = asyncio.Event()
+    get_status = api.get_status
+
+    async def blocked_get_status(vin, *args, **kwargs):
+        if vin == "VIN1":
+            await release.wait()
+        return await get_status(vin, *args, **kwargs)
+
+    api.get_status = blocked_get_status
+    fleet = VwIdFleet(hass, entry, api)
+    await fleet.async_setup()
+
+    restored = fleet.coordinators["VIN1"]
+    assert restored.stale
+    assert restored.data.battery.current_soc_pct == 50
+    assert fleet.history["VIN1"].window()["time"] == []
+
+    release.set()
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    assert not restored.stale
+    assert restored.data.battery.current_soc_pct == 1
+    # The whole status replaces the saved one
+    assert api.sections[-1] is None
+    fleet.async_shutdown()
+
+
+async def test_saved_status_when_api_is_down(hass, hass_storage):
+    """Test the saved vehicles and status are used while the API fails."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    save_status(hass_storage, entry, {"VIN1": 50})
+    api = FakeApi([])
+
+    async def failing(*args, **kwargs):
+        raise ApiError("down")
+
+    api.get_vehicles = api.get_status = failing
+    fleet = VwIdFleet(hass, entry, api)
+    await fleet.async_setup()
+    assert fleet.vins == ["VIN1"]
+    await hass.async_block_till_done()
+
+    coordinator = fleet.coordinators["VIN1"]
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+    assert coordinator.stale
+    assert coordinator.data.battery.current_soc_pct == 50
+    fleet.async_shutdown()
+
+
+async def test_discovery_errors(hass):
+    """Test errors listing the vehicles at the first setup are retried."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    api = FakeApi([])
+    fleet = VwIdFleet(hass, entry, api)
+    with pytest.raises(ConfigEntryNotReady):
+        await fleet.async_setup()
+
+    for error in (aiohttp.ClientError("down"), asyncio.TimeoutError()):
+
+        async def failing():
+            raise error
+
+        api.get_vehicles = failing
+        with pytest.raises(ConfigEntryNotReady):
+            await VwIdFleet(hass, entry, api).async_setup()
+
+
+async def test_changed_vehicles_reload(hass, hass_storage):
+    """Test the entry is reloaded once when the account has other vehicles."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    save_status(hass_storage, entry, {"VIN1": 50, "VIN2": 60})
+    # VIN2 was removed from the account and VIN3 added
+    api = FakeApi(["VIN1", "VIN3"])
+
+    for vins, reloads in ((["VIN1", "VIN2"], 1), (["VIN1", "VIN3"], 0)):
+        fleet = VwIdFleet(hass, entry, api)
+        with patch.object(hass.config_entries, "async_reload") as reload:
+            await fleet.async_setup()
+            assert fleet.vins == vins
+            await hass.async_block_till_done()
+        assert reload.call_count == reloads
+        fleet.async_shutdown()
+
+    # The new vehicle was polled at the setup after the reload
+    assert fleet.coordinators["VIN3"].data.battery.current_soc_pct == 3
+    assert not fleet.coordinators["VIN3"].stale
+    saved = hass_storage[STORAGE_KEY_STATUS.format(entry.entry_id)]["data"]
+    assert saved["vins"] == ["VIN1", "VIN3"]
+
+
+async def test_unchanged_status_while_charging(hass):
+    """Test the entities are notified when only the charging meter moved."""
+    api = FakeApi(["VIN1"])
+    charging = {
+        "data": {
+            "chargingStatus": {"chargingState": "charging", "chargePower_kW": 11},
+            "plugStatus": {"plugConnectionState": "connected"},
+        }
+    }
+    responses = [charging, UNCHANGED, UNCHANGED]
+
+    async def get_status(vin, allow_unchanged=False, sections=None, caller=None):
+        return responses.pop(0)
+
+    api.get_status = get_status
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    fleet = VwIdFleet(hass, entry, api)
+    await fleet.async_setup()
+    fleet.async_shutdown()
+    coordinator = fleet.coordinators["VIN1"]
+    listener = Mock()
+    coordinator.async_add_listener(listener)
+
+    await coordinator.async_refresh()
+    assert fleet.meters["VIN1"].total_energy_kwh > 0
+    assert listener.call_count == 1
+
+    # Not charging, so nothing moved
+    charging["data"]["chargingStatus"]["chargePower_kW"] = 0
+    coordinator.data = parse_status(charging)
+    fleet.meters["VIN1"].last_power_kw = 0
+    await coordinator.async_refresh()
+    assert listener.call_count == 1
@@ -0,0 +1,74 @@
+"""Test the charging session meter."""
+import pytest
+
+from custom_components.vwid.energy import ChargingMeter
+from custom_components.vwid.model import parse_status
+
+
+def status(plug, charging="readyForCharging", power=0):
+    """Return a status with the given plug, charging state and power."""
+    return parse_status(
+        {
+            "data": {
+                "chargingStatus": {"chargingState": charging, "chargePower_kW": power},
+                "plugStatus": {"plugConnectionState": plug},
+            }
+        }
+    )
+
+
+def test_charging_session():
+    """Test the energy of a session is integrated and reset per session."""
+    meter = ChargingMeter()
+    meter.add(0, status("disconnected"), 0.3)
+    assert not meter.session_active
+
+    meter.add(600, status("connected"), 0.3)
+    assert meter.session_active
+    assert meter.session_start == 600
+    meter.add(1200, status("connected", "charging", 11), 0.3)
+    meter.add(4800, status("connected", "charging", 11), 0.3)
+    meter.add(5400, status("connected", "readyForCharging", 0), 0.3)
+
+    # 10 minutes ramping up, an hour at 11 kW and 10 minutes ramping down
+    assert meter.session_energy_kwh == pytest.approx(11 / 12 + 11 + 11 / 12)
+    assert meter.session_cost == pytest.approx(meter.session_energy_kwh * 0.3)
+
+    meter.add(6000, status("disconnected"), 0.3)
+    assert not meter.session_active
+    session = meter.session_energy_kwh
+
+    meter.add(7000, status("connected", "charging", 7), 0.3)
+    assert meter.session_energy_kwh == 0
+    meter.add(7360, status("connected", "charging", 7), 0.3)
+    assert meter.session_energy_kwh == pytest.approx(0.7)
+    assert meter.total_energy_kwh == pytest.approx(session + 0.7)
+
+
+def test_stored_meter():
+    """Test a meter continues from its stored state."""
+    meter = ChargingMeter()
+    meter.add(0, status("connected", "charging", 10), 0.25)
+    meter.add(360, status("connected", "charging", 10), 0.25)
+
+    restored = ChargingMeter.from_dict(meter.as_dict())
+    restored.add(720, status("connected", "charging", 10), 0.25)
+    assert restored.session_energy_kwh == pytest.approx(2.0)
+    assert restored.total_cost == pytest.approx(0.5)
+    assert restored.session_start == 0
+
+
+def test_gap_is_not_integrated():
+    """Test nothing is added over a gap longer than max_gap, e.g. a restart."""
+    meter = ChargingMeter()
+    meter.add(0, status("connected", "charging", 11), 0.25, max_gap=900)
+    meter.add(360, status("connected", "charging", 11), 0.25, max_gap=900)
+    assert meter.session_energy_kwh == pytest.approx(1.1)
+
+    restored = ChargingMeter.from_dict(meter.as_dict())
+    # 12 hours later
+    restored.add(43560, status("connected", "charging", 11), 0.25, max_gap=900)
+    assert restored.session_energy_kwh == pytest.approx(1.1)
+    restored.add(43920, status("connected", "charging", 11), 0.25, max_gap=900)
+    assert restored.session_energy_kwh == pytest.approx(2.2)
+    assert restored.total_cost == pytest.approx(0.55)
@@ -0,0 +1,46 @@
+"""Test the estimation of the state of charge between polls."""
+from custom_components.vwid.estimator import captured_time, charge_finish, estimate_soc
+from custom_components.vwid.model import parse_status
+
+CAPTURED = "2021-06-01T12:00:00Z"
+
+
+def status(charging="charging", remaining=60, soc=50, target=80):
+    """Return the status of a charging car."""
+    return parse_status(
+        {
+            "data": {
+                "batteryStatus": {"currentSOC_pct": soc},
+                "chargingStatus": {
+                    "carCapturedTimestamp": CAPTURED,
+                    "chargingState": charging,
+                    "remainingChargingTimeToComplete_min": remaining,
+                },
+                "chargingSettings": {"targetSOC_pct": target},
+            }
+        }
+    )
+
+
+def test_estimate_soc():
+    """Test the state of charge rises linearly to the target."""
+    start = captured_time(CAPTURED)
+    assert charge_finish(status()) == start + 3600
+
+    assert estimate_soc(status(), start) == 50
+    assert estimate_soc(status(), start + 1800) == 65
+    assert estimate_soc(status(), start + 7200) == 80
+    assert estimate_soc(status(target=None), start + 1800) == 75
+
+
+def test_no_estimate():
+    """Test the polled value is used when nothing can be predicted."""
+    start = captured_time(CAPTURED)
+    assert estimate_soc(status(charging="readyForCharging"), start + 1800) == 50
+    assert estimate_soc(status(remaining=None), start + 1800) == 50
+    assert estimate_soc(status(soc=90), start + 1800) == 90
+    assert charge_finish(status(remaining=None)) is None
+    assert estimate_soc(None, start) is None
+    # Without a charging section
+    battery_only = parse_status({"data": {"batteryStatus": {"currentSOC_pct": 50}}})
+    assert estimate_soc(battery_only, start) == 50
@@ -0,0 +1,81 @@
+"""Test the JSON Lines exporter against the stand-in cloud."""
+import json
+import os
+import subprocess
+import sys
+
+from aiohttp.test_utils import TestServer
+import pytest
+
+from script import exporter
+from script.exporter import JsonLinesWriter, export, vwid
+
+from .vwcloud import VwCloud
+
+
+@pytest.fixture
+async def api(socket_enabled):
+    """Return a logged in client talking to the stand-in server."""
+    cloud = VwCloud(vins=["VIN1", "VIN2", "VIN3"])
+    server = TestServer(cloud.app)
+    await server.start_server()
+    url = str(server.make_url("")).rstrip("/")
+    api = vwid()
+    api.set_base_urls(url, url, url)
+    api.set_credentials(cloud.username, cloud.password)
+    assert await api.reconnect() is True
+    yield api
+    api.close()
+    await api.close_session()
+    await server.close()
+
+
+async def test_export_rounds(api, tmp_path):
+    """Test every vehicle is written once per round, failures included."""
+    path = tmp_path / "fleet.jsonl"
+    writer = JsonLinesWriter(str(path))
+    await export(api, ["VIN1", "VIN2", "VIN4"], writer, workers=2, interval=0, rounds=2)
+    writer.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 6
+    assert sorted(record["vin"] for record in records[:3]) == ["VIN1", "VIN2", "VIN4"]
+    by_vin = {record["vin"]: record for record in records}
+    assert by_vin["VIN2"]["data"]["batteryStatus"]["currentSOC_pct"] == 80
+    assert "error" in by_vin["VIN4"]
+    assert api.metrics["status"].count == 6
+
+
+def test_rotation(tmp_path):
+    """Test the output file is rotated at its maximum size."""
+    path = tmp_path / "fleet.jsonl"
+    writer = JsonLinesWriter(str(path), max_bytes=100, backup_count=2)
+    for index in range(10):
+        writer.write({"vin": "VIN1", "index": index, "padding": "x" * 20})
+    writer.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "fleet.jsonl",
+        "fleet.jsonl.1",
+        "fleet.jsonl.2",
+    ]
+    assert json.loads(path.read_text().splitlines()[-1])["index"] == 9
+
+
+def test_runs_without_home_assistant():
+    """Test the exporter loads libvwid without the integration."""
+    root = os.path.dirname(os.path.dirname(exporter.__file__))
+    code = (
+        "import sys; import script.exporter; "
+        "assert not [m for m in sys.modules if m.startswith('homeassistant')]; "
+        "assert 'custom_components.vwid' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
+    result = subprocess.run(
+        [sys.executable, "-m", "script.exporter", "--help"],
+        cwd=root,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert "--once" in result.stdout
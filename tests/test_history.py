@@ -0,0 +1,73 @@
+"""Test the in-memory history of the vehicle values."""
+from unittest.mock import Mock
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.vwid import websocket
+from custom_components.vwid.const import DOMAIN
+from custom_components.vwid.coordinator import VwIdFleet
+from custom_components.vwid.history import VehicleHistory
+from custom_components.vwid.model import parse_status
+
+
+def status(soc, power=None):
+    """Return a status with the given state of charge and charge power."""
+    data = {"batteryStatus": {"currentSOC_pct": soc}}
+    if power is not None:
+        data["chargingStatus"] = {"chargePower_kW": power}
+    return parse_status({"data": data})
+
+
+def test_ring_buffer():
+    """Test the buffer keeps the newest samples in order."""
+    history = VehicleHistory(capacity=4)
+    for second in range(6):
+        history.add(float(second), status(50 + second, power=11))
+
+    assert len(history) == 4
+    samples = history.window()
+    assert samples["time"] == [2.0, 3.0, 4.0, 5.0]
+    assert samples["soc_pct"] == [52.0, 53.0, 54.0, 55.0]
+    assert samples["charge_power_kw"] == [11.0] * 4
+    assert samples["range_km"] == [None] * 4
+    assert history.window(start=3, end=4)["soc_pct"] == [53.0, 54.0]
+
+
+def test_downsample():
+    """Test samples are averaged over equal time buckets."""
+    history = VehicleHistory()
+    for second in range(10):
+        history.add(float(second), status(second, power=None if second < 5 else 7))
+
+    samples = history.downsample(2)
+    assert samples["time"] == [2.0, 7.0]
+    assert samples["soc_pct"] == [2.0, 7.0]
+    assert samples["charge_power_kw"] == [None, 7.0]
+    assert history.downsample(20) == history.window()
+
+
+async def test_websocket_history(hass):
+    """Test the history command returns the samples of a vehicle."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    fleet = VwIdFleet(hass, entry, None)
+    fleet.history["VIN"] = VehicleHistory()
+    for second in range(4):
+        fleet.history["VIN"].add(float(second), status(second))
+    hass.data[DOMAIN] = {entry.entry_id: fleet}
+    connection = Mock()
+
+    websocket.websocket_history(
+        hass, connection, {"id": 1, "type": "vwid/history", "vin": "VIN", "start": 2}
+    )
+    result = connection.send_result.call_args[0][1]
+    assert result["soc_pct"] == [2.0, 3.0]
+
+    websocket.websocket_history(
+        hass, connection, {"id": 2, "type": "vwid/history", "vin": "VIN", "points": 1}
+    )
+    assert connection.send_result.call_args[0][1]["soc_pct"] == [1.5]
+
+    websocket.websocket_history(
+        hass, connection, {"id": 3, "type": "vwid/history", "vin": "OTHER"}
+    )
+    assert connection.send_error.call_args[0][:2] == (3, "not_found")
@@ -1,9 +1,50 @@
 """Test component setup."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
 from homeassistant.setup import async_setup_component
 
-from custom_components.vwid.const import DOMAIN
+from custom_components.vwid import async_setup_entry
+from custom_components.vwid.const import DATA_CLIENTS, DOMAIN
 
 
 async def test_async_setup(hass):
     """Test the component gets setup."""
     assert await async_setup_component(hass, DOMAIN, {}) is True
+
+
+async def test_options_reload_entry(hass):
+    """Test changed options reload the entry."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    entry.add_to_hass(hass)
+    hass.data[DOMAIN] = {DATA_CLIENTS: AsyncMock()}
+    with patch("custom_components.vwid.VwIdFleet") as fleet, patch.object(
+        hass.config_entries, "async_forward_entry_setup"
+    ):
+        fleet.return_value.async_setup = AsyncMock()
+        assert await async_setup_entry(hass, entry)
+        await hass.async_block_till_done()
+
+    with patch.object(hass.config_entries, "async_reload") as reload:
+        hass.config_entries.async_update_entry(
+            entry, options={"push_transport": "mqtt"}
+        )
+        await hass.async_block_till_done()
+    reload.assert_called_once_with(entry.entry_id)
+
+
+async def test_failed_setup_shuts_down_fleet(hass):
+    """Test a fleet failing to set up stops polling before its client closes."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"name": "user", "password": "pw"})
+    clients = AsyncMock()
+    hass.data[DOMAIN] = {DATA_CLIENTS: clients}
+    with patch("custom_components.vwid.VwIdFleet") as fleet, pytest.raises(
+        RuntimeError
+    ):
+        fleet.return_value.async_setup = AsyncMock(side_effect=RuntimeError)
+        await async_setup_entry(hass, entry)
+
+    fleet.return_value.async_shutdown.assert_called_once_with()
+    clients.async_release.assert_called_once_with(entry)
@@ -0,0 +1,154 @@
+"""Test the We Connect ID API client."""
+import asyncio
+import base64
+import json
+import pathlib
+import time
+
+import aiohttp
+import pytest
+
+from custom_components.vwid.libvwid import (
+    REFRESH_MARGIN,
+    parse_login_form,
+    token_expiry,
+    vwid,
+)
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+def make_token(exp):
+    """Return an unsigned JWT expiring at the given unix time."""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode())
+    return "eyJhbGciOiJub25lIn0." + payload.decode().rstrip("=") + ".sig"
+
+
+def test_token_expiry():
+    """Test the expiry is read from the token payload."""
+    assert token_expiry(make_token(1234567890)) == 1234567890
+    assert token_expiry("not-a-jwt") is None
+    assert token_expiry(None) is None
+
+
+async def test_resume_uses_valid_stored_token():
+    """Test a still valid access token is used without any request."""
+    api = vwid(None)
+    access = make_token(int(time.time()) + 3600)
+    api.set_tokens({"accessToken": access, "refreshToken": "refresh"})
+
+    assert await api.resume() is True
+    assert api.headers["Authorization"] == "Bearer " + access
+    assert api.token_valid()
+    assert api.refresh_timer is not None
+    assert api.stats["reconnects"] == 0
+    api.close()
+    assert api.refresh_timer is None
+
+
+async def test_expiring_token_is_not_valid():
+    """Test a token inside the refresh margin counts as expired."""
+    api = vwid(None)
+    api.token_expires = time.time() + REFRESH_MARGIN - 1
+    assert not api.token_valid()
+
+
+class FakeResponse:
+    """Minimal stand-in for an aiohttp response."""
+
+    def __init__(self, status, payload=None):
+        """Initialize the response."""
+        self.status = status
+        self.payload = payload
+
+    async def read(self):
+        """Return the JSON payload as body."""
+        return json.dumps(self.payload).encode()
+
+
+class FakeRequest:
+    """Request context manager, as returned by aiohttp's session.request."""
+
+    def __init__(self, response):
+        """Initialize with the coroutine returning the response."""
+        self.response = response
+
+    async def __aenter__(self):
+        """Return the response."""
+        return await self.response
+
+    async def __aexit__(self, *exc_info):
+        """Release the response."""
+
+
+class FakeRefreshSession:
+    """Session answering token refreshes after yielding to the event loop."""
+
+    def __init__(self):
+        """Initialize the session."""
+        self.refreshes = 0
+
+    def request(self, method, url, **kwargs):
+        """Answer a refresh request with a new token set."""
+        return FakeRequest(self.refresh())
+
+    async def refresh(self):
+        """Return a new token set after yielding to the event loop."""
+        self.refreshes += 1
+        await asyncio.sleep(0)
+        access = make_token(int(time.time()) + 3600)
+        return FakeResponse(200, {"accessToken": access, "refreshToken": "refresh"})
+
+
+async def test_authenticate_single_flight():
+    """Test concurrent callers share one token refresh."""
+    session = FakeRefreshSession()
+    api = vwid(session)
+    api.set_tokens({"accessToken": "expired", "refreshToken": "refresh"})
+    rejected = api.headers
+
+    results = await asyncio.gather(*(api.authenticate(rejected) for _ in range(5)))
+
+    assert results == [True] * 5
+    assert session.refreshes == 1
+    assert "Authorization" not in rejected
+    # Headers were replaced by the refresh, so a late caller holding the old
+    # snapshot does not refresh again
+    assert await api.authenticate(rejected) is True
+    assert session.refreshes == 1
+    api.close()
+
+
+
+class FailingSession:
+    """Session failing every request."""
+
+    def request(self, method, url, **kwargs):
+        """Fail the request."""
+        raise aiohttp.ClientConnectionError("down")
+
+
+async def test_proactive_refresh_errors_are_logged(caplog):
+    """Test a failing background refresh is logged instead of left unretrieved."""
+    api = vwid(FailingSession())
+    api.set_tokens({"accessToken": "expired", "refreshToken": "refresh"})
+
+    api.start_proactive_refresh()
+    await api.refresh_task
+
+    assert "Refreshing tokens before expiry failed: down" in caplog.text
+    api.close()
+
+def test_parse_login_form():
+    """Test the login form matches what an lxml DOM parse finds."""
+    lxml_html = pytest.importorskip("lxml.html")
+
+    for name in ("login_email.html", "login_password.html"):
+        text = (FIXTURES / name).read_bytes()
+        page = lxml_html.fromstring(text)
+        hidden = page.xpath('//form//input[@type="hidden"]')
+        expected = {x.attrib["name"]: x.attrib["value"] for x in hidden}
+
+        assert parse_login_form(text) == (expected, page.forms[0].action)
+
+    assert parse_login_form(b"<html><body>No form</body></html>") == ({}, None)
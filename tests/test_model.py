@@ -0,0 +1,54 @@
+"""Test the typed status model."""
+from custom_components.vwid.model import (
+    SECTIONS,
+    BatteryStatus,
+    VehicleStatus,
+    parse_status,
+    status_document,
+)
+
+from .vwcloud import make_status
+
+
+def test_parse_status():
+    """Test a status document is parsed into the compact model."""
+    status = parse_status(make_status("VIN"))
+
+    assert status.battery == BatteryStatus(80, 320)
+    assert status.charging.charging_state == "readyForCharging"
+    assert status.plug.plug_connection_state == "disconnected"
+    assert status.climatisation_settings.zone_front_left_enabled == "true"
+
+
+def test_parse_missing_sections():
+    """Test missing or malformed sections are None."""
+    status = parse_status({"data": {"batteryStatus": None, "plugStatus": {}}})
+
+    assert status.battery is None
+    assert status.charging is None
+    assert status.plug.plug_lock_state is None
+    assert parse_status({}) == VehicleStatus(*(None,) * len(SECTIONS))
+
+
+def test_parse_fetched_sections():
+    """Test sections not fetched keep their previous value."""
+    previous = parse_status(make_status("VIN"))
+    status = parse_status(
+        {"data": {"batteryStatus": {"currentSOC_pct": 81}}},
+        previous,
+        {"battery", "charging"},
+    )
+
+    assert status.battery.current_soc_pct == 81
+    assert status.charging is None
+    assert status.plug is previous.plug
+    assert status.climatisation_settings is previous.climatisation_settings
+
+
+def test_status_document():
+    """Test a status survives saving it as a status document."""
+    status = parse_status(make_status("VIN"))._replace(plug=None)
+    document = status_document(status)
+
+    assert "plugStatus" not in document["data"]
+    assert parse_status(document) == status
@@ -0,0 +1,37 @@
+"""Test the profiling of a refresh cycle."""
+import os
+
+from custom_components.vwid.profiler import async_profile_refresh
+
+
+class FakeFleet:
+    """Fleet recording its full refreshes."""
+
+    def __init__(self, vins):
+        """Initialize the fleet."""
+        self.vins = vins
+        self.refreshed = []
+
+    async def async_refresh_full(self, vin):
+        """Record the refresh."""
+        self.refreshed.append(vin)
+
+
+async def test_profile_refresh(hass, tmp_path):
+    """Test the profile and its summary are written to the config dir."""
+    hass.config.config_dir = str(tmp_path)
+    fleets = [FakeFleet(["VIN1", "VIN2"]), FakeFleet(["VIN3"])]
+
+    path = await async_profile_refresh(hass, fleets, top=5)
+
+    assert [fleet.refreshed for fleet in fleets] == [["VIN1", "VIN2"], ["VIN3"]]
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.getsize(f"{path}.prof") > 0
+    with open(f"{path}.txt") as file:
+        summary = file.read()
+    assert "Ordered by: cumulative time" in summary
+    assert "Ordered by: internal time" in summary
+
+    await async_profile_refresh(hass, fleets, vin="VIN3")
+    assert fleets[1].refreshed == ["VIN3", "VIN3"]
+    assert fleets[0].refreshed == ["VIN1", "VIN2"]
@@ -0,0 +1,149 @@
+"""Test the sensors."""
+import logging
+from unittest.mock import patch
+
+from aiohttp.test_utils import TestServer
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import EntityCategory
+
+from custom_components.vwid.const import DOMAIN
+from custom_components.vwid.coordinator import VwIdCoordinator
+from custom_components.vwid.model import parse_status
+from custom_components.vwid.libvwid import vwid
+from custom_components.vwid.sensor import (
+    METRICS,
+    SENSORS,
+    VwIdMetricSensor,
+    VwIdSensor,
+)
+
+from .vwcloud import VwCloud
+
+
+def status(soc):
+    """Return a status with the given state of charge."""
+    return parse_status({"data": {"batteryStatus": {"currentSOC_pct": soc}}})
+
+
+async def test_unchanged_state_is_not_written(hass):
+    """Test a refresh only writes the entities whose state changed."""
+    coordinator = VwIdCoordinator(hass, logging.getLogger(__name__), name="test")
+    coordinator.data = status(50)
+    sensor = VwIdSensor(coordinator, "VIN", SENSORS[0])
+    sensor.hass = hass
+    sensor._written = sensor._state_snapshot()
+
+    with patch.object(sensor, "async_write_ha_state") as write:
+        sensor._handle_coordinator_update()
+        assert not write.called
+        assert coordinator.suppressed_writes == 1
+
+        coordinator.data = status(51)
+        sensor._handle_coordinator_update()
+        assert write.call_count == 1
+        assert coordinator.state_writes == 1
+
+
+def test_sensor_values(hass):
+    """Test the sensors read their value from the vehicle status."""
+    coordinator = VwIdCoordinator(hass, logging.getLogger(__name__), name="test")
+    coordinator.data = parse_status(
+        {
+            "data": {
+                "batteryStatus": {"currentSOC_pct": 80},
+                "climatisationSettings": {"zoneFrontLeftEnabled": "true"},
+            }
+        }
+    )
+    sensors = {
+        description.name: VwIdSensor(coordinator, "VIN", description)
+        for description in SENSORS
+    }
+
+    soc = sensors["Volkswagen ID State Of Charge"]
+    assert soc.state == 80
+    assert soc.unit_of_measurement == "%"
+    assert soc.unique_id == "VIN_Volkswagen ID State Of Charge"
+    assert sensors["Volkswagen ID Zone Front Left Enabled"].state is True
+    # Missing sections read as unknown
+    assert sensors["Volkswagen ID Plug Lock State"].state is None
+    assert sensors["Volkswagen ID Zone Front Right Enabled"].state is None
+
+
+def test_stale_status(hass):
+    """Test a saved status keeps the sensors available, flagged as stale."""
+    coordinator = VwIdCoordinator(hass, logging.getLogger(__name__), name="test")
+    coordinator.data = status(50)
+    coordinator.stale = True
+    coordinator.last_update_success = False
+    sensor = VwIdSensor(coordinator, "VIN", SENSORS[0])
+
+    assert sensor.available
+    assert sensor.extra_state_attributes == {"vin": "VIN", "stale": True}
+
+    coordinator.stale = False
+    assert not sensor.available
+    assert sensor.extra_state_attributes == {"vin": "VIN"}
+
+
+def test_metric_sensors():
+    """Test the diagnostic sensors read the API client's metrics."""
+    api = vwid(None)
+    for latency in (0.1, 0.2, 0.3, 0.4, 2.0):
+        api.metrics["status"].add(latency, failed=latency > 1)
+    api.stats["reconnects"] = 2
+    api.metrics["status"].connections_reused = 4
+    sensors = {
+        description.key: VwIdMetricSensor(api, "entry", description)
+        for description in METRICS
+    }
+
+    assert sensors["status_latency_p50"].state == 300.0
+    assert sensors["status_latency_p95"].state == 2000.0
+    assert sensors["status_latency_p95"].unit_of_measurement == "ms"
+    assert sensors["status_requests"].state == 5
+    assert sensors["login_latency_p50"].state is None
+    assert sensors["failed_requests"].state == 1
+    assert sensors["status_connections_reused"].state == 4
+    assert sensors["status_connections_opened"].state == 0
+    assert sensors["reconnects"].state == 2
+    assert sensors["reconnects"].unique_id == "entry_reconnects"
+    assert not sensors["reconnects"].entity_registry_enabled_default
+
+
+async def test_entities_registered(hass, socket_enabled):
+    """Test an entry set up against the stand-in cloud registers its entities."""
+    cloud = VwCloud(vins=["VIN1"])
+    server = TestServer(cloud.app)
+    await server.start_server()
+    url = str(server.make_url("")).rstrip("/")
+
+    def client():
+        api = vwid()
+        api.set_base_urls(url, url, url)
+        return api
+
+    entry = MockConfigEntry(
+        domain=DOMAIN, data={"name": cloud.username, "password": cloud.password}
+    )
+    entry.add_to_hass(hass)
+    with patch("custom_components.vwid.client.vwid", client):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    registry = er.async_get(hass)
+    soc = registry.async_get_entity_id(
+        "sensor", DOMAIN, "VIN1_Volkswagen ID State Of Charge"
+    )
+    assert hass.states.get(soc).state == "80"
+    metric = registry.async_get(
+        registry.async_get_entity_id("sensor", DOMAIN, f"{entry.entry_id}_reconnects")
+    )
+    assert metric.entity_category is EntityCategory.DIAGNOSTIC
+    assert metric.disabled_by is er.RegistryEntryDisabler.INTEGRATION
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+    await server.close()
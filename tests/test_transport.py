@@ -0,0 +1,132 @@
+"""Test the sources of the status updates of a fleet."""
+import json
+from unittest.mock import Mock
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.const import CONF_WEBHOOK_ID
+
+from custom_components.vwid.const import (
+    CONF_MQTT_TOPIC,
+    CONF_PUSH_TRANSPORT,
+    DEFAULT_SLOW_INTERVAL,
+    DOMAIN,
+    PUSH_MQTT,
+    PUSH_WEBHOOK,
+)
+from custom_components.vwid.coordinator import PUSH_SAFETY_NET_INTERVAL, VwIdFleet
+from custom_components.vwid.transport import (
+    VwIdMqttTransport,
+    VwIdWebhookTransport,
+    create_push_transport,
+)
+
+from .test_coordinator import FakeApi
+
+
+async def setup_fleet(hass, vins, options=None):
+    """Return a polling fleet of the vehicles."""
+    entry = MockConfigEntry(
+        domain=DOMAIN, data={"name": "user", "password": "pw"}, options=options or {}
+    )
+    fleet = VwIdFleet(hass, entry, FakeApi(vins))
+    await fleet.async_setup()
+    return fleet
+
+
+class FakeRequest:
+    """Webhook request with a JSON body."""
+
+    def __init__(self, body):
+        """Initialize the request."""
+        self.body = body
+
+    async def json(self):
+        """Return the decoded body."""
+        return json.loads(self.body)
+
+
+async def test_mqtt_push(hass):
+    """Test a pushed status updates the coordinator and slows down polling."""
+    fleet = await setup_fleet(hass, ["VIN1", "VIN2"])
+    transport = VwIdMqttTransport(fleet, "vwid")
+    coordinator = fleet.coordinators["VIN1"]
+    listener = Mock()
+    coordinator.async_add_listener(listener)
+    assert fleet.async_interval("VIN1") == DEFAULT_SLOW_INTERVAL
+
+    payload = {"data": {"chargingStatus": {"chargingState": "charging"}}}
+    transport._async_handle_message(
+        Mock(topic="vwid/VIN1/status", payload=json.dumps(payload))
+    )
+
+    assert listener.call_count == 1
+    assert coordinator.data.charging.charging_state == "charging"
+    # Sections not pushed keep their last value
+    assert coordinator.data.battery.current_soc_pct == 1
+    assert fleet.history["VIN1"].window()["soc_pct"] == [1.0, 1.0]
+    assert fleet.async_interval("VIN1") == PUSH_SAFETY_NET_INTERVAL
+    assert fleet.async_interval("VIN2") == DEFAULT_SLOW_INTERVAL
+    due = fleet.polling._due["VIN1"] - hass.loop.time()
+    assert PUSH_SAFETY_NET_INTERVAL - 1 < due <= PUSH_SAFETY_NET_INTERVAL
+
+    # Invalid documents and unknown vehicles are ignored
+    transport._async_handle_message(Mock(topic="vwid/VIN1/status", payload="{"))
+    transport._async_handle_message(
+        Mock(topic="vwid/VIN3/status", payload=json.dumps(payload))
+    )
+    transport._async_handle_message(Mock(topic="vwid/VIN1/status", payload="[]"))
+    assert listener.call_count == 1
+    fleet.async_shutdown()
+
+
+async def test_webhook_push(hass):
+    """Test statuses posted to the webhook, with and without a VIN."""
+    fleet = await setup_fleet(hass, ["VIN1"])
+    transport = VwIdWebhookTransport(fleet, "hook")
+    handle = transport._async_handle_webhook
+
+    response = await handle(
+        hass, "hook", FakeRequest('{"data": {"batteryStatus": {"currentSOC_pct": 55}}}')
+    )
+    assert response.status == 200
+    assert fleet.coordinators["VIN1"].data.battery.current_soc_pct == 55
+
+    response = await handle(
+        hass,
+        "hook",
+        FakeRequest(
+            '{"vin": "VIN1", "data": {"batteryStatus": {"currentSOC_pct": 56}}}'
+        ),
+    )
+    assert response.status == 200
+    assert fleet.coordinators["VIN1"].data.battery.current_soc_pct == 56
+
+    assert (await handle(hass, "hook", FakeRequest("nope"))).status == 400
+    unknown = FakeRequest('{"vin": "VIN2", "data": {}}')
+    assert (await handle(hass, "hook", unknown)).status == 400
+    fleet.async_shutdown()
+
+
+async def test_create_push_transport(hass):
+    """Test the push transport follows the options."""
+    fleet = await setup_fleet(hass, ["VIN1"])
+    assert create_push_transport(fleet) is None
+    assert fleet.push is None
+
+    fleet.entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={CONF_PUSH_TRANSPORT: PUSH_MQTT, CONF_MQTT_TOPIC: "bridge"},
+    )
+    transport = create_push_transport(fleet)
+    assert isinstance(transport, VwIdMqttTransport)
+    assert transport.topic == "bridge"
+
+    fleet.entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={CONF_PUSH_TRANSPORT: PUSH_WEBHOOK, CONF_WEBHOOK_ID: "hook"},
+    )
+    transport = create_push_transport(fleet)
+    assert isinstance(transport, VwIdWebhookTransport)
+    assert transport.webhook_id == "hook"
+    fleet.async_shutdown()
@@ -0,0 +1,159 @@
+"""Test vwid against the local stand-in for the We Connect ID cloud."""
+from aiohttp.test_utils import TestServer
+import pytest
+
+from custom_components.vwid import libvwid
+from custom_components.vwid.libvwid import UNCHANGED, ApiCircuitOpen, ApiError, vwid
+
+from .vwcloud import VwCloud
+
+
+@pytest.fixture
+async def cloud(socket_enabled):
+    """Run the stand-in server."""
+    cloud = VwCloud(vins=["VIN1", "VIN2"])
+    server = TestServer(cloud.app)
+    await server.start_server()
+    cloud.url = str(server.make_url("")).rstrip("/")
+    yield cloud
+    await server.close()
+
+
+@pytest.fixture
+async def api(cloud):
+    """Return a client with its own session talking to the stand-in server."""
+    api = vwid()
+    api.set_base_urls(cloud.url, cloud.url, cloud.url)
+    api.set_credentials(cloud.username, cloud.password)
+    yield api
+    api.close()
+    await api.close_session()
+
+
+async def test_login_and_status(cloud, api):
+    """Test the full login chain and a status request."""
+    cloud.terms = True
+    assert await api.reconnect() is True
+    assert cloud.requests["terms"] == 1
+    assert await api.get_vehicles() == [
+        {"vin": "VIN1", "nickname": "VIN1"},
+        {"vin": "VIN2", "nickname": "VIN2"},
+    ]
+    status = await api.get_status("VIN2")
+    assert status["data"]["batteryStatus"]["currentSOC_pct"] == 80
+
+    for endpoint in ("authorize", "email", "password", "login", "vehicles", "status"):
+        assert api.metrics[endpoint].count == 1
+        assert api.metrics[endpoint].percentile(95) > 0
+    assert api.metrics["refresh"].percentile(50) is None
+
+
+async def test_unchanged_status(cloud, api):
+    """Test a repeated status body is reported as unchanged, not decoded."""
+    assert await api.reconnect() is True
+    assert await api.get_status("VIN1", allow_unchanged=True) is not UNCHANGED
+    assert await api.get_status("VIN1", allow_unchanged=True) is UNCHANGED
+    # Only the VIN of the same body counts
+    assert await api.get_status("VIN2", allow_unchanged=True) is not UNCHANGED
+    assert await api.get_status("VIN1") is not UNCHANGED
+    # Each caller of a shared client compares with its own last body
+    assert await api.get_status("VIN1", True, caller="entry") is not UNCHANGED
+    assert await api.get_status("VIN1", True, caller="entry") is UNCHANGED
+
+    cloud.status["VIN1"]["data"]["batteryStatus"]["currentSOC_pct"] = 81
+    status = await api.get_status("VIN1", allow_unchanged=True)
+    assert status["data"]["batteryStatus"]["currentSOC_pct"] == 81
+    assert api.stats["unchanged_responses"] == 2
+
+
+async def test_connection_reuse(cloud, api):
+    """Test status polls reuse the pooled connection, with minimal headers."""
+    assert await api.reconnect() is True
+    for _ in range(5):
+        assert await api.get_status("VIN1")
+
+    status = api.metrics["status"]
+    assert status.connections_created + status.connections_reused == 5
+    assert status.connections_reused >= 4
+    assert set(api.headers) == {"Accept", "Accept-Encoding", "Authorization"}
+
+
+async def test_status_sections(cloud, api):
+    """Test only the requested status sections are returned."""
+    assert await api.reconnect() is True
+    status = await api.get_status("VIN1", sections=["batteryStatus", "plugStatus"])
+    assert sorted(status["data"]) == ["batteryStatus", "plugStatus"]
+
+
+async def test_expired_token_is_refreshed(cloud, api):
+    """Test a rejected access token is refreshed instead of logging in."""
+    assert await api.reconnect() is True
+    cloud.access_tokens.clear()
+
+    assert await api.get_status("VIN1")
+    assert cloud.requests["refresh"] == 1
+    assert cloud.requests["login"] == 1
+    assert api.stats["retried_requests"] == 1
+    # The rejected request and the retry
+    assert api.metrics["status"].count == 2
+    assert api.metrics["status"].failures == 1
+
+
+async def test_server_errors_back_off(cloud, api, monkeypatch):
+    """Test a 503 is retried after Retry-After without authenticating again."""
+    assert await api.reconnect() is True
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(libvwid.asyncio, "sleep", sleep)
+    cloud.fail_status = 503
+    cloud.fail_count = 2
+    cloud.retry_after = 3
+
+    assert await api.get_status("VIN1")
+    assert sleeps == [3.0, 3.0]
+    assert "refresh" not in cloud.requests
+    assert cloud.requests["login"] == 1
+
+    cloud.fail_count = libvwid.MAX_RETRIES + 1
+    with pytest.raises(ApiError):
+        await api.get_status("VIN1")
+
+
+async def test_circuit_breaker(cloud, api, monkeypatch):
+    """Test repeated server errors pause all requests."""
+    assert await api.reconnect() is True
+
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(libvwid.asyncio, "sleep", sleep)
+    cloud.fail_count = 100
+
+    with pytest.raises(ApiError):
+        await api.get_status("VIN1")
+    with pytest.raises(ApiCircuitOpen):
+        await api.get_status("VIN1")
+    requests = cloud.requests["status"]
+    assert requests == libvwid.CIRCUIT_THRESHOLD
+
+    # No request goes out while the circuit is open
+    with pytest.raises(ApiCircuitOpen):
+        await api.get_status("VIN2")
+    assert cloud.requests["status"] == requests
+    assert "refresh" not in cloud.requests
+
+
+async def test_commands_and_settings(cloud, api):
+    """Test commands and setting changes show up in the next status."""
+    assert await api.reconnect() is True
+    await api.start_charging("VIN1")
+    await api.set_charging_settings({"targetSOC_pct": 90}, "VIN1")
+
+    status = await api.get_status("VIN1")
+    assert status["data"]["chargingStatus"]["chargingState"] == "charging"
+    assert status["data"]["chargingSettings"]["targetSOC_pct"] == 90
+    assert api.metrics["command"].count == 1
+    assert api.metrics["settings"].count == 1
@@ -0,0 +1,365 @@
+"""Local stand-in for the We Connect ID cloud.
+
+Serves the login chain, the token endpoints and the vehicle endpoints on a
+single aiohttp server, so vwid can be exercised and benchmarked without a
+real account:
+
+    cloud = VwCloud(vins=["WVWZZZE1ZMP000001"])
+    server = TestServer(cloud.app)
+    await server.start_server()
+    cloud.url = str(server.make_url("")).rstrip("/")
+    api = vwid()
+    api.set_base_urls(cloud.url, cloud.url, cloud.url)
+"""
+import asyncio
+import base64
+import json
+import random
+import secrets
+import time
+from urllib.parse import urlencode
+
+from aiohttp import web
+
+CLIENT = "a24fba63-34b3-4d43-b181-942111e6bda8@apps_vw-dilab_com"
+SIGNIN = f"/signin-service/v1/{CLIENT}"
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>Volkswagen ID</title>
+<script>window._IDK = {{csrf_token: '{csrf}'}};</script></head>
+<body><main>
+<form id="{form_id}" method="POST" action="{action}">
+  <input type="hidden" name="_csrf" value="{csrf}"/>
+  <input type="hidden" name="relayState" value="{relay_state}"/>
+  <input type="hidden" name="hmac" value="{hmac}"/>
+  {fields}
+  <button type="submit">Next</button>
+</form>
+</main><footer>{footer}</footer></body></html>
+"""
+FOOTER = "".join(f'<a href="/legal/{n}">Legal notice {n}</a>' for n in range(50))
+
+
+def make_jwt(lifetime):
+    """Return an unsigned JWT expiring after lifetime seconds."""
+    payload = {"exp": int(time.time() + lifetime), "jti": secrets.token_hex(8)}
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    return "eyJhbGciOiJub25lIn0." + encoded.rstrip("=") + ".c2ln"
+
+
+def redirect(status, location):
+    """Return a redirect without a body, like the identity provider sends."""
+    return web.Response(status=status, headers={"Location": location})
+
+
+def make_status(vin):
+    """Return a status document of a parked, unplugged car."""
+    return {
+        "data": {
+            "batteryStatus": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "currentSOC_pct": 80,
+                "cruisingRangeElectric_km": 320,
+            },
+            "chargingStatus": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "remainingChargingTimeToComplete_min": 0,
+                "chargingState": "readyForCharging",
+                "chargeMode": "manual",
+                "chargePower_kW": 0,
+                "chargeRate_kmph": 0,
+            },
+            "chargingSettings": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "maxChargeCurrentAC": "maximum",
+                "autoUnlockPlugWhenCharged": "permanent",
+                "targetSOC_pct": 90,
+            },
+            "plugStatus": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "plugConnectionState": "disconnected",
+                "plugLockState": "unlocked",
+            },
+            "climatisationStatus": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "remainingClimatisationTime_min": 0,
+                "climatisationState": "off",
+            },
+            "climatisationSettings": {
+                "carCapturedTimestamp": "2021-06-01T12:00:00Z",
+                "targetTemperature_K": 295.15,
+                "targetTemperature_C": 22,
+                "targetTemperature_F": 72,
+                "climatisationWithoutExternalPower": True,
+                "climatizationAtUnlock": "false",
+                "windowHeatingEnabled": False,
+                "zoneFrontLeftEnabled": "true",
+                "zoneFrontRightEnabled": "false",
+            },
+        }
+    }
+
+
+class VwCloud:
+    """The stand-in server with its knobs and request counters.
+
+    The status endpoint only returns the sections listed in its jobs query
+    parameter, when given.
+
+    latency: seconds added to every vehicle endpoint response.
+    fail_status / fail_count: answer the next fail_count vehicle requests
+    with fail_status.
+    retry_after: Retry-After header value sent with injected failures.
+    failure_rate: fraction of vehicle requests answered with fail_status.
+    terms: ask for the terms and conditions once after the password.
+    """
+
+    def __init__(
+        self,
+        vins=("WVWZZZE1ZMP000001",),
+        username="driver@example.com",
+        password="secret",
+        token_lifetime=3600,
+    ):
+        """Initialize the stand-in."""
+        self.vins = list(vins)
+        self.username = username
+        self.password = password
+        self.token_lifetime = token_lifetime
+        self.status = {vin: make_status(vin) for vin in self.vins}
+        self.latency = 0.0
+        self.fail_status = 500
+        self.fail_count = 0
+        self.failure_rate = 0.0
+        self.retry_after = None
+        self.terms = False
+        self.access_tokens = set()
+        self.refresh_tokens = set()
+        self.requests = {}
+        # Base URL, set by whoever starts the server
+        self.url = None
+        self.app = web.Application()
+        self.app.router.add_get("/authorize", self.authorize)
+        self.app.router.add_get(f"{SIGNIN}/login/identifier", self.email_page)
+        self.app.router.add_post(f"{SIGNIN}/login/identifier", self.email_form)
+        self.app.router.add_post(f"{SIGNIN}/login/authenticate", self.password_form)
+        self.app.router.add_get(f"{SIGNIN}/terms-and-conditions", self.terms_page)
+        self.app.router.add_post(f"{SIGNIN}/terms-and-conditions", self.terms_form)
+        self.app.router.add_get("/oidc/v1/oauth/sso", self.sso, name="sso")
+        self.app.router.add_get(
+            "/oidc/v1/oauth/client/callback", self.callback, name="callback"
+        )
+        self.app.router.add_post("/login/v1", self.login)
+        self.app.router.add_get("/refresh/v1", self.refresh)
+        self.app.router.add_get("/vehicles", self.vehicles)
+        self.app.router.add_get("/vehicles/{vin}/status", self.vehicle_status)
+        self.app.router.add_post(
+            "/vehicles/{vin}/{domain:charging|climatisation}/{action:start|stop}",
+            self.command,
+        )
+        self.app.router.add_put(
+            "/vehicles/{vin}/{domain:charging|climatisation}/settings", self.settings
+        )
+
+    def count(self, name):
+        """Count a request to an endpoint."""
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    def page(self, request, form_id, action, fields):
+        """Return a login page with one form."""
+        html = PAGE.format(
+            form_id=form_id,
+            action=action,
+            csrf=secrets.token_hex(8),
+            relay_state=secrets.token_hex(20),
+            hmac=secrets.token_hex(32),
+            fields=fields,
+            footer=FOOTER,
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    def issue_tokens(self):
+        """Return a new token set."""
+        access = make_jwt(self.token_lifetime)
+        refresh = make_jwt(30 * 24 * 3600)
+        self.access_tokens.add(access)
+        self.refresh_tokens.add(refresh)
+        return {"accessToken": access, "refreshToken": refresh, "idToken": make_jwt(3600)}
+
+    def route_url(self, request, route):
+        """Return the absolute URL of a named route."""
+        return str(request.url.join(request.app.router[route].url_for()))
+
+    def bearer(self, request):
+        """Return the bearer token of a request."""
+        return request.headers.get("Authorization", "").partition("Bearer ")[2]
+
+    async def authorize(self, request):
+        """Redirect to the email page, like the identity provider does."""
+        self.count("authorize")
+        return redirect(302, f"{SIGNIN}/login/identifier")
+
+    async def email_page(self, request):
+        """Ask for the email address."""
+        return self.page(
+            request,
+            "emailPasswordForm",
+            f"{SIGNIN}/login/identifier",
+            '<input type="email" name="email"/>',
+        )
+
+    async def email_form(self, request):
+        """Take the email address and ask for the password."""
+        self.count("email")
+        form = await request.post()
+        if form.get("email") != self.username or "_csrf" not in form:
+            raise web.HTTPBadRequest()
+        return self.page(
+            request,
+            "credentialsForm",
+            f"{SIGNIN}/login/authenticate",
+            f'<input type="hidden" name="email" value="{self.username}"/>'
+            '<input type="password" name="password"/>',
+        )
+
+    async def password_form(self, request):
+        """Check the password and start the redirect chain."""
+        self.count("password")
+        form = await request.post()
+        if form.get("password") != self.password:
+            raise web.HTTPUnauthorized()
+        if self.terms:
+            return redirect(303, f"{SIGNIN}/terms-and-conditions?relayState=1")
+        return redirect(302, self.route_url(request, "sso"))
+
+    async def terms_page(self, request):
+        """Ask to accept the terms and conditions."""
+        self.count("terms")
+        return self.page(
+            request, "termsForm", f"{SIGNIN}/terms-and-conditions", ""
+        )
+
+    async def terms_form(self, request):
+        """Accept the terms and continue the redirect chain."""
+        self.terms = False
+        return redirect(302, self.route_url(request, "sso"))
+
+    async def sso(self, request):
+        """First hop of the redirect chain."""
+        self.count("redirect")
+        return redirect(302, self.route_url(request, "callback"))
+
+    async def callback(self, request):
+        """Last hop, handing the tokens to the app."""
+        self.count("redirect")
+        fragment = urlencode(
+            {
+                "state": secrets.token_hex(8),
+                "code": secrets.token_hex(16),
+                "access_token": make_jwt(3600),
+                "id_token": make_jwt(3600),
+                "token_type": "bearer",
+            }
+        )
+        return redirect(302, f"weconnect://authenticated#{fragment}")
+
+    async def login(self, request):
+        """Exchange the authorization code for API tokens."""
+        self.count("login")
+        payload = await request.json()
+        if not payload.get("authorizationCode"):
+            raise web.HTTPBadRequest()
+        return web.json_response(self.issue_tokens())
+
+    async def refresh(self, request):
+        """Exchange a refresh token for a new token set."""
+        self.count("refresh")
+        token = self.bearer(request)
+        if token not in self.refresh_tokens:
+            raise web.HTTPUnauthorized()
+        self.refresh_tokens.discard(token)
+        return web.json_response(self.issue_tokens())
+
+    def failure(self):
+        """Return an injected failure."""
+        headers = {}
+        if self.retry_after is not None:
+            headers["Retry-After"] = str(self.retry_after)
+        return web.Response(status=self.fail_status, headers=headers)
+
+    async def vehicle_endpoint(self, request, name):
+        """Apply latency, failure injection and authorization."""
+        self.count(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_count > 0:
+            self.fail_count -= 1
+            return self.failure()
+        if self.failure_rate and random.random() < self.failure_rate:
+            return self.failure()
+        if self.bearer(request) not in self.access_tokens:
+            raise web.HTTPUnauthorized()
+        return None
+
+    async def vehicles(self, request):
+        """Return the vehicles of the account."""
+        failed = await self.vehicle_endpoint(request, "vehicles")
+        if failed is not None:
+            return failed
+        return web.json_response(
+            {"data": [{"vin": vin, "nickname": vin[-4:]} for vin in self.vins]}
+        )
+
+    async def vehicle_status(self, request):
+        """Return the status of a vehicle."""
+        failed = await self.vehicle_endpoint(request, "status")
+        if failed is not None:
+            return failed
+        vin = request.match_info["vin"]
+        if vin not in self.status:
+            raise web.HTTPNotFound()
+        status = self.status[vin]
+        if "jobs" in request.query:
+            jobs = request.query["jobs"].split(",")
+            status = {
+                "data": {
+                    section: value
+                    for section, value in status["data"].items()
+                    if section in jobs
+                }
+            }
+        return web.json_response(status)
+
+    def vehicle_data(self, request):
+        """Return the status data of the vehicle of a request."""
+        vin = request.match_info["vin"]
+        if vin not in self.status:
+            raise web.HTTPNotFound()
+        return self.status[vin]["data"]
+
+    async def command(self, request):
+        """Start or stop charging or climatisation right away."""
+        failed = await self.vehicle_endpoint(request, "command")
+        if failed is not None:
+            return failed
+        data = self.vehicle_data(request)
+        start = request.match_info["action"] == "start"
+        if request.match_info["domain"] == "charging":
+            data["chargingStatus"]["chargingState"] = (
+                "charging" if start else "readyForCharging"
+            )
+        else:
+            data["climatisationStatus"]["climatisationState"] = (
+                "heating" if start else "off"
+            )
+        return web.json_response({"data": {"requestID": secrets.token_hex(8)}})
+
+    async def settings(self, request):
+        """Update charging or climatisation settings."""
+        failed = await self.vehicle_endpoint(request, "settings")
+        if failed is not None:
+            return failed
+        data = self.vehicle_data(request)
+        section = request.match_info["domain"] + "Settings"
+        data[section].update(await request.json())
+        return web.json_response({"data": {"requestID": secrets.token_hex(8)}})